@@ -27,18 +27,32 @@
 # ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import argparse
+import array
 import bisect
 import collections
 from collections import deque
 import functools
 import heapq
+import inspect
 import itertools
+import json
+import math
+import multiprocessing
+import operator
+from multiprocessing import shared_memory
+import os
 import sys
 import random
+import tempfile
 import time
 from typing import Callable, Collection, Iterable, Sequence
 from typing import Any, Generic, TypeVar
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 ####################################
 # utility classes and other things #
@@ -56,11 +70,22 @@ IGNORED_TYPES = ()
 NESTED_TYPES = (Collection,Sequence,Iterable,)
 REC_TYPES = (str,bytes,)
 # ^
+# for merge_sort_natural:
+MIN_GALLOP = 7 # consecutive wins of a run before galloping
+MAX_MINRUN = 64 # upper bound of the minimum run length
+# ^
 
-MERGE_FUNCS_NAMES = 'merge_sorted merge_sorted_b merge_sorted_c merge_sorted_g merge_sorted_i'.split()
-MSORT_FUNCS_NAMES = 'merge_sort merge_sort2 merge_sort3 merge_sort4 merge_sort5'.split()
+MERGE_FUNCS_NAMES = 'merge_sorted merge_sorted_b merge_sorted_c merge_sorted_g merge_sorted_i merge_sorted_k merge_gallop merge_sorted_n'.split()
+MSORT_FUNCS_NAMES = 'merge_sort merge_sort2 merge_sort3 merge_sort4 merge_sort5 merge_sort_k merge_sort_natural'.split()
 OTHER_SORT_FUNC_NAMES = '_merge_sort5 heap_sort heap_sorti bubble_sort'.split()
 GROUPING_FUNC_NAMES = 'group_sort group_sorti group_sort2 until_sorti'.split()
+# for the benchmarks:
+BENCH_FUNCS_NAMES = MSORT_FUNCS_NAMES + OTHER_SORT_FUNC_NAMES + ['sorted']
+BENCH_INPUTS = ('random', 'sorted', 'reversed', 'almost-sorted', 'few-unique')
+BENCH_SIZES = (500, 1000, 2000, 4000, 8000)
+# quadratic ones (reducing the runs in a single growing sequence):
+BENCH_MAX_SIZE = {'bubble_sort': 1000, 'merge_sort': 4000, 'merge_sort2': 4000, 'merge_sort5': 4000}
+BENCH_TOLERANCE = 0.15 # exponents growth reported as regressions
 
 class Config:
     def __new__ (cls, **k):
@@ -81,14 +106,30 @@ class Config:
         return dict((attr, getattr(self, attr)) for attr in self.fields)
 
 
+# sentinels for exhausted iterators and missing arguments:
+_END = object()
+_NODEFAULT = object()
+
+class _Reversed:
+    """Wraps a key inverting its ordering (for reverse sorting with heaps)."""
+    __slots__ = ('value',)
+    def __init__ (self, value):
+        self.value = value
+    def __lt__ (self, other):
+        return other.value < self.value
+    def __eq__ (self, other):
+        return self.value == other.value
+
 class Injecretor:
     """Like an iterator, better than an iterator :-D
     0. can insert multiple value to be yielded while looping on it.
     1. can retrieve the last yielded value (helpful in some circustances).
+    2. can peek the next value without consuming it.
     """
+    __slots__ = ('_seq', '_next_vals', '_last', '_name')
     def __init__ (self, seq, name='noname', last=None):
         self._seq = iter(seq)
-        self._next_vals = []
+        self._next_vals = deque()
         self._last = last
         self._name = name
     @property
@@ -98,17 +139,23 @@ class Injecretor:
         return self
     def __next__(self):
         if self._next_vals:
-            self._last = self._next_vals.pop(0)
-            return self.last
-        try:
+            self._last = self._next_vals.popleft()
+        else:
             self._last = next(self._seq)
-            return self.last
+        return self._last
+    def peek (self, default=_NODEFAULT):
+        """Returns the next value without consuming it. If the iterator
+        is exhausted returns `default` if given, else raise StopIteration."""
+        if self._next_vals:
+            return self._next_vals[0]
+        try:
+            value = next(self._seq)
         except StopIteration:
-            if self._next_vals:
-                self._last = self._next_vals.pop(0)
-                return self.last
-            else:
-                raise StopIteration
+            if default is _NODEFAULT:
+                raise
+            return default
+        self._next_vals.append(value)
+        return value
     def send (self, value):
         self._next_vals.append(value)
 
@@ -126,6 +173,37 @@ def timer (f):
         return ret
     return inner
 
+def with_keywords (func: Callable, key: Callable = None, reverse: bool = False) -> Callable:
+    """Returns `func` with the `key` and `reverse` keywords bound, only
+    if they differ from the defaults (so functions which doesn't take them
+    still works as before)."""
+    kw = {}
+    if key is not None:
+        kw['key'] = key
+    if reverse:
+        kw['reverse'] = reverse
+    return functools.partial(func, **kw) if kw else func
+
+def keyed (sort_func: Callable) -> Callable:
+    """To be used as decorator of the sorting functions, for a decorate-once
+    `key` support: every key is computed exactly once, kept in a parallel list,
+    then `sort_func` sorts the indexes of the items merging on that list
+    (so the merging functions must support `key` and `reverse` too).
+    Arrays of numbers (see is_numeric) are sorted by numeric_merge_sort when
+    numpy is available, but only without a `key` and without an explicit
+    merging function (which numeric_merge_sort can't use)."""
+    @functools.wraps(sort_func)
+    def inner (seq, *a, key=None, reverse=False, **k):
+        if key is None:
+            if not a and not k and numpy is not None and is_numeric(seq):
+                return numeric_merge_sort(seq, reverse).tolist()
+            return sort_func(seq, *a, reverse=reverse, **k)
+        items = seq if isinstance(seq, Sequence) else list(seq)
+        keys = list(map(key, items))
+        idxs = sort_func(range(len(items)), *a, key=keys.__getitem__, reverse=reverse, **k)
+        return [items[i] for i in idxs]
+    return inner
+
 #####################
 # utility functions #
 #####################
@@ -159,8 +237,10 @@ def iflatten (seq, ignore=IGNORED_TYPES):
 ##### GROUPING #####
 ####################
 
-def group_sort (seq: Sequence) -> Sequence:
-    """Returns items from `seq` grouped while sorted."""
+def group_sort (seq: Sequence, *, key: Callable = None, reverse: bool = False) -> Sequence:
+    """Returns items from `seq` grouped while sorted
+    (on `key`, if given, in descending order if `reverse`)."""
+    ok = operator.le if reverse else operator.ge
     slst = []
     lst = []
     it = iter(seq)
@@ -169,20 +249,24 @@ def group_sort (seq: Sequence) -> Sequence:
         lst.append(a)
     except StopIteration:
         return slst
+    ka = a if key is None else key(a)
     for i in it:
-        if i >= a:
+        ki = i if key is None else key(i)
+        if ok(ki, ka):
             lst.append(i)
-            a = i
+            ka = ki
         else:
             slst.append(lst)
-            a = i
-            lst = [a]
+            ka = ki
+            lst = [i]
     if lst:
         slst.append(lst)
     return slst
 
-def group_sorti (seq: Sequence) -> Iterable:
-    """Yields items from `seq` grouped while sorted."""
+def group_sorti (seq: Sequence, *, key: Callable = None, reverse: bool = False) -> Iterable:
+    """Yields items from `seq` grouped while sorted
+    (on `key`, if given, in descending order if `reverse`)."""
+    ok = operator.le if reverse else operator.ge
     slst = []
     lst = []
     it = iter(seq)
@@ -191,19 +275,23 @@ def group_sorti (seq: Sequence) -> Iterable:
         lst.append(a)
     except StopIteration:
         return slst
+    ka = a if key is None else key(a)
     for i in it:
-        if i >= a:
+        ki = i if key is None else key(i)
+        if ok(ki, ka):
             lst.append(i)
-            a = i
+            ka = ki
         else:
             yield lst
-            a = i
-            lst = [a]
+            ka = ki
+            lst = [i]
     if lst:
         yield lst
 
-def group_sort2 (seq: Sequence) -> Sequence:
-    """Returns items from `seq` grouped while sorted."""
+def group_sort2 (seq: Sequence, *, key: Callable = None, reverse: bool = False) -> Sequence:
+    """Returns items from `seq` grouped while sorted
+    (on `key`, if given, in descending order if `reverse`)."""
+    ok = operator.le if reverse else operator.ge
     slst = []
     it, it2 = itertools.tee(seq, 2)
     pidx = 0
@@ -211,13 +299,15 @@ def group_sort2 (seq: Sequence) -> Sequence:
         a = next(it)
     except StopIteration:
         return slst
+    ka = a if key is None else key(a)
     idx = 1
     for idx, i in enumerate(it, 1):
-        if i >= a:
-            a = i
+        ki = i if key is None else key(i)
+        if ok(ki, ka):
+            ka = ki
         else:
             slst.append(list(itertools.islice(it2, idx-pidx)))
-            a = i
+            ka = ki
             pidx = idx
     last = list(itertools.islice(it2, idx-pidx+1))
     if last:
@@ -235,27 +325,31 @@ def reduce(func: Callable, seq: Sequence, init: Any = None) -> Any:
         val = func(val, i)
     return val
 
-def sort_two (seq: Sequence) -> Sequence:
+def sort_two (seq: Sequence, *, key: Callable = None, reverse: bool = False) -> Sequence:
     """Return sorted seqs of items, two by two.
-    Items must support the `>` operator."""
+    Items (or their `key`) must support the `>` and `<` operators."""
     pairs = []
     for lst in takes(seq, 2):
         if len(lst) == 1:
             pairs.append(tuple(lst))
         else:
             a, b = lst
-            pairs.append((b,a) if a > b else (a, b))
+            ka, kb = (a, b) if key is None else (key(a), key(b))
+            swap = ka < kb if reverse else ka > kb
+            pairs.append((b,a) if swap else (a, b))
     return pairs
 
-def isort_two (seq: Sequence) -> Iterable:
+def isort_two (seq: Sequence, *, key: Callable = None, reverse: bool = False) -> Iterable:
     """Return sorted seqs of items, two by two.
-    Items must support the `>` operator."""
+    Items (or their `key`) must support the `>` and `<` operators."""
     for take in takes(seq, 2):
         if len(take) == 1:
             yield tuple(take)
         else:
             a, b = take
-            yield (b,a) if a > b else (a, b)
+            ka, kb = (a, b) if key is None else (key(a), key(b))
+            swap = ka < kb if reverse else ka > kb
+            yield (b,a) if swap else (a, b)
 
 
 def takes (seq: Sequence, n: int) -> Iterable:
@@ -279,28 +373,83 @@ def takes_f (seq: Sequence, n: int, fillvalue: Any = None) -> Iterable:
             p.extend([fillvalue]*(n-len(p)))
         yield p
 
-def until_sorti (seq: Sequence) -> Iterable:
-    """Yields items from `seq` grouped until sorted."""
+def until_sorti (seq: Sequence, *, key: Callable = None, reverse: bool = False) -> Iterable:
+    """Yields items from `seq` grouped until sorted
+    (on `key`, if given, in descending order if `reverse`)."""
+    ok = operator.le if reverse else operator.ge
     it = Injecretor(seq)
     lst = []
+    ka = _END
     while True:
         try:
             a = next(it)
             lst.append(a)
         except StopIteration:
             break
+        if ka is _END: # else is the key of the item sent back
+            ka = a if key is None else key(a)
         for i in it:
-            if i >= a:
+            ki = i if key is None else key(i)
+            if ok(ki, ka):
                 lst.append(i)
-                a = i
+                ka = ki
             else:
                 yield lst
                 lst = []
                 it.send(i)
+                ka = ki
                 break
     if lst:
         yield lst
 
+def min_run_length (n: int) -> int:
+    """Returns the minimum run length for sorting `n` items (as Timsort does):
+    `n` itself if less than MAX_MINRUN, else a value in [MAX_MINRUN/2, MAX_MINRUN]
+    such that n/minrun is (close to, but not above) a power of two."""
+    r = 0
+    while n >= MAX_MINRUN:
+        r |= n & 1
+        n >>= 1
+    return n + r
+
+def natural_runs (seq: Sequence, *, key: Callable = None, minrun: int = None) -> Iterable:
+    """Yields (items, keys) pairs of lists of the sorted runs of `seq`
+    (`keys` is `items` itself if no `key` is given). Strictly descending
+    runs are reversed (so it's stable), runs shorter than `minrun`
+    (default: from min_run_length) are extended using binary insertion.
+    Every pair of adjacent items is compared once at most while scanning,
+    so finding the runs of n items takes n-1 comparisons."""
+    items = list(seq)
+    keys = items if key is None else list(map(key, items))
+    size = len(items)
+    if minrun is None:
+        minrun = min_run_length(size)
+    lo = 0
+    while lo < size:
+        hi = lo + 1
+        if hi < size and keys[hi] < keys[lo]:
+            while hi + 1 < size and keys[hi+1] < keys[hi]:
+                hi += 1
+            hi += 1
+            run = items[lo:hi][::-1]
+            rkeys = run if keys is items else keys[lo:hi][::-1]
+        else:
+            # keys[lo] <= keys[lo+1] is known already, don't compare them again
+            hi = min(lo + 2, size)
+            while hi < size and not keys[hi] < keys[hi-1]:
+                hi += 1
+            run = items[lo:hi]
+            rkeys = run if keys is items else keys[lo:hi]
+        stop = min(lo + minrun, size)
+        for idx in range(hi, stop):
+            k = keys[idx]
+            pos = bisect.bisect_right(rkeys, k)
+            run.insert(pos, items[idx])
+            if rkeys is not run:
+                rkeys.insert(pos, k)
+        yield run, rkeys
+        lo = max(hi, stop)
+
 def zip_2 (s1: Sequence, s2: Sequence, fillvalue: Any = None) -> Iterable:
     """Yields pairs of items from `s1` and `s2` stopping at the
     end of the shorter sequence, with missing value replaced by `fillvalue`."""
@@ -331,17 +480,24 @@ def zip_2 (s1: Sequence, s2: Sequence, fillvalue: Any = None) -> Iterable:
 # Merging functions #
 #####################
 
-def merge_sorted (s1: Sequence, s2: Sequence) -> Sequence:
+def merge_sorted (s1: Sequence, s2: Sequence, *,
+                  key: Callable = None, reverse: bool = False) -> Sequence:
     """Merge two ordered sequences returning a third
-    (paro paro from wikipedia ^L^)."""
+    (paro paro from wikipedia ^L^).
+    Compares the `key` of the items (computed once per item), if given;
+    merge sequences in descending order if `reverse`. As all the
+    merging functions, is stable: on ties, items from `s1` comes first."""
+    first = operator.ge if reverse else operator.le
     lst1 = list(s1)
     lst2 = list(s2)
+    keys1 = lst1 if key is None else list(map(key, lst1))
+    keys2 = lst2 if key is None else list(map(key, lst2))
     len1 = len(lst1)
     len2 = len(lst2)
     i1 = i2 = 0
     merged = []
     while i1 < len1 and i2 < len2:
-        if lst1[i1] <= lst2[i2]:
+        if first(keys1[i1], keys2[i2]):
             merged.append(lst1[i1])
             i1 += 1
         else:
@@ -355,108 +511,292 @@ def merge_sorted (s1: Sequence, s2: Sequence) -> Sequence:
         i2 += 1
     return merged
 
-def merge_sorted_b (s1: Sequence, s2: Sequence) -> Iterable:
-    """Merge two ordered sequences returning a third. Use bisect."""
+def merge_sorted_b (s1: Sequence, s2: Sequence, *,
+                    key: Callable = None, reverse: bool = False) -> Iterable:
+    """Merge two ordered sequences returning a third. Use bisect
+    (on a parallel list of the `s1` keys, if `key` is given)."""
+    if reverse:
+        # merging the reversed sequences in the other order keeps it stable.
+        merged = merge_sorted_b(list(s2)[::-1], list(s1)[::-1], key=key)
+        merged.reverse()
+        return merged
     m = list(s1)
+    mk = m if key is None else list(map(key, m))
     low = 0
     for item in s2:
-        idx = bisect.bisect_left(m, item, low)
-        bisect.insort_left(m, item, idx)
-        low = idx
+        k = item if key is None else key(item)
+        idx = bisect.bisect_right(mk, k, low)
+        m.insert(idx, item)
+        if mk is not m:
+            mk.insert(idx, k)
+        low = idx + 1
     return m
 
-def merge_sorted_c (s1: Sequence, s2: Sequence) -> Iterable:
+def merge_sorted_c (s1: Sequence, s2: Sequence, *,
+                    key: Callable = None, reverse: bool = False) -> Iterable:
     """Merge two ordered sequences returning a third. Better."""
+    first = operator.ge if reverse else operator.le
     merged = collections.deque()
     g1 = Injecretor(s1,name='s1')
     g2 = Injecretor(s2,name='s2')
-    while True:
-        try:
-            i = next(g1)
-        except StopIteration:
-            i = None
-        try:
-            j = next(g2)
-        except StopIteration:
-            j = None
-        try:
-            if i <= j:
-                merged.append(i)
-                g2.send(j)
-            else:
-                merged.append(j)
-                g1.send(i)
-        except TypeError as e:
-            if i is None and j is None:
-                break
-            elif i is None:
-                g2.send(j)
-                merged.extend(g2)
-                break
-            elif j is None:
-                g1.send(i)
-                merged.extend(g1)
-                break
+    i = g1.peek(_END)
+    j = g2.peek(_END)
+    if i is not _END and j is not _END:
+        ki = i if key is None else key(i)
+        kj = j if key is None else key(j)
+        while True:
+            if first(ki, kj):
+                merged.append(next(g1))
+                i = g1.peek(_END)
+                if i is _END:
+                    break
+                ki = i if key is None else key(i)
             else:
-                raise e
+                merged.append(next(g2))
+                j = g2.peek(_END)
+                if j is _END:
+                    break
+                kj = j if key is None else key(j)
+    merged.extend(g1)
+    merged.extend(g2)
     return merged
 
 
-def merge_sorted_g (s1: Sequence, s2: Sequence) -> Sequence:
-    """Merge two ordered sequences returning a third."""
-    g1 = Injecretor(s1,name='s1')
-    g2 = Injecretor(s2,name='s2')
+def merge_sorted_g (s1: Sequence, s2: Sequence, *,
+                    key: Callable = None, reverse: bool = False) -> Sequence:
+    """Merge two ordered sequences returning a third.
+    Two cursors on the sequences (other iterables are copied to lists)
+    and on the parallel lists of their keys, if `key` is given."""
+    first = operator.ge if reverse else operator.le
+    lst1 = s1 if isinstance(s1, Sequence) else list(s1)
+    lst2 = s2 if isinstance(s2, Sequence) else list(s2)
+    keys1 = lst1 if key is None else list(map(key, lst1))
+    keys2 = lst2 if key is None else list(map(key, lst2))
+    len1 = len(lst1)
+    len2 = len(lst2)
+    i1 = i2 = 0
     merged = []
-    for i, j in itertools.zip_longest(g1, g2, fillvalue=None):
-        try:
-            if i <= j:
-                merged.append(i)
-                g2.send(j)
-            else:
-                merged.append(j)
-                g1.send(i)
-        except TypeError:
-            if i is None and j is None:
-                break
-            elif i is None:
-                g2.send(j)
-                break
-            elif j is None:
-                g1.send(i)
-                break
+    append = merged.append
+    if len1 and len2:
+        a = keys1[0]
+        b = keys2[0]
+        while True:
+            if first(a, b):
+                append(lst1[i1])
+                i1 += 1
+                if i1 == len1:
+                    break
+                a = keys1[i1]
             else:
-                raise
-    merged.extend(g1)
-    merged.extend(g2)
+                append(lst2[i2])
+                i2 += 1
+                if i2 == len2:
+                    break
+                b = keys2[i2]
+    merged.extend(lst1[i1:])
+    merged.extend(lst2[i2:])
     return merged
 
-def merge_sorted_i (s1: Sequence, s2: Sequence) -> Iterable:
+def merge_sorted_i (s1: Sequence, s2: Sequence, *,
+                    key: Callable = None, reverse: bool = False) -> Iterable:
     """Merge two ordered sequences, returns an iterator over the resulting seq."""
-    g1 = Injecretor(s1,name='s1')
-    g2 = Injecretor(s2,name='s2')
-    for i, j in itertools.zip_longest(g1, g2, fillvalue=None):
-        try:
-            if i <= j:
+    first = operator.ge if reverse else operator.le
+    it1 = iter(s1)
+    it2 = iter(s2)
+    i = next(it1, _END)
+    j = next(it2, _END)
+    if i is not _END and j is not _END:
+        ki = i if key is None else key(i)
+        kj = j if key is None else key(j)
+        while True:
+            if first(ki, kj):
                 yield i
-                g2.send(j)
+                i = next(it1, _END)
+                if i is _END:
+                    break
+                ki = i if key is None else key(i)
             else:
                 yield j
-                g1.send(i)
-        except TypeError:
-            if i is None and j is None:
-                return
-            elif i is None:
-                g2.send(j)
-                break
-            elif j is None:
-                g1.send(i)
-                break
-            else:
-                raise
-    for i in g1:
+                j = next(it2, _END)
+                if j is _END:
+                    break
+                kj = j if key is None else key(j)
+    if i is not _END:
         yield i
-    for j in g2:
+        yield from it1
+    if j is not _END:
         yield j
+        yield from it2
+
+def merge_sorted_k (*seqs: Sequence, key: Callable = None, reverse: bool = False) -> Iterable:
+    """Merge any number of ordered sequences (k-way merge using a heap),
+    returns an iterator over the resulting seq. Takes O(n log k).
+    Stable: equal items are yielded in the order of the sequences."""
+    wrap = _Reversed if reverse else None
+    heap = []
+    for idx, seq in enumerate(seqs):
+        it = iter(seq)
+        value = next(it, _END)
+        if value is not _END:
+            k = value if key is None else key(value)
+            heap.append([k if wrap is None else wrap(k), idx, value, it])
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        entry = heap[0]
+        yield entry[2]
+        value = next(entry[3], _END)
+        if value is _END:
+            heapq.heappop(heap)
+        else:
+            k = value if key is None else key(value)
+            entry[0] = k if wrap is None else wrap(k)
+            entry[2] = value
+            heapq.heapreplace(heap, entry)
+    if heap:
+        _, _, value, it = heap[0]
+        yield value
+        yield from it
+
+def merge_rounds (func: Callable, seqs: Collection[Sequence], **kwargs) -> Sequence:
+    """Merge $seqs using the two-way merging function `func`,
+    merging the sequences in pairs, in rounds (a tournament tree),
+    so every item is merged O(log k) times. `kwargs` (i.e. `key` and
+    `reverse`) are passed to `func`."""
+    seqs = list(seqs)
+    if not seqs:
+        return []
+    while len(seqs) > 1:
+        seqs = [a if b is None else list(func(a, b, **kwargs)) for a, b in takes_f(seqs, 2)]
+    return seqs[0]
+
+def gallop_right (keys: Sequence, x: Any, lo: int = 0, hi: int = None) -> int:
+    """Like bisect.bisect_right, for `keys[lo:hi]` but searching `x` first
+    at exponentially growing distances from `lo`, so finds the insertion point
+    in O(log d) for d positions from `lo` (instead of O(log(hi - lo)))."""
+    if hi is None:
+        hi = len(keys)
+    base = lo
+    step = 1
+    while lo + step <= hi and not x < keys[lo+step-1]:
+        base = lo + step
+        step *= 2
+    return bisect.bisect_right(keys, x, base, min(lo + step, hi))
+
+def gallop_left (keys: Sequence, x: Any, lo: int = 0, hi: int = None) -> int:
+    """Like gallop_right, but returns the insertion point before the
+    items equal to `x` (as bisect.bisect_left)."""
+    if hi is None:
+        hi = len(keys)
+    base = lo
+    step = 1
+    while lo + step <= hi and keys[lo+step-1] < x:
+        base = lo + step
+        step *= 2
+    return bisect.bisect_left(keys, x, base, min(lo + step, hi))
+
+def _gallop_merge (items1: list, keys1: list, items2: list, keys2: list,
+                   min_gallop: int = MIN_GALLOP) -> Pair[list, list]:
+    """Merge the sorted runs `items1` and `items2` comparing their
+    parallel lists of keys (which can be the items lists themselves).
+    After `min_gallop` consecutive wins of a run, copy at once all the
+    items of that run which precede the current one of the other run
+    (found with gallop_right|gallop_left). Returns the (items, keys) merged."""
+    len1 = len(items1)
+    len2 = len(items2)
+    merged = []
+    mkeys = merged if (keys1 is items1 and keys2 is items2) else []
+    i1 = i2 = wins1 = wins2 = 0
+    while i1 < len1 and i2 < len2:
+        if not keys2[i2] < keys1[i1]:
+            merged.append(items1[i1])
+            if mkeys is not merged:
+                mkeys.append(keys1[i1])
+            i1 += 1
+            wins1 += 1
+            wins2 = 0
+            if wins1 >= min_gallop:
+                n = gallop_right(keys1, keys2[i2], i1)
+                merged.extend(items1[i1:n])
+                if mkeys is not merged:
+                    mkeys.extend(keys1[i1:n])
+                i1 = n
+                wins1 = 0
+        else:
+            merged.append(items2[i2])
+            if mkeys is not merged:
+                mkeys.append(keys2[i2])
+            i2 += 1
+            wins2 += 1
+            wins1 = 0
+            if wins2 >= min_gallop and i2 < len2:
+                n = gallop_left(keys2, keys1[i1], i2)
+                merged.extend(items2[i2:n])
+                if mkeys is not merged:
+                    mkeys.extend(keys2[i2:n])
+                i2 = n
+                wins2 = 0
+    merged.extend(items1[i1:])
+    merged.extend(items2[i2:])
+    if mkeys is not merged:
+        mkeys.extend(keys1[i1:])
+        mkeys.extend(keys2[i2:])
+    return merged, mkeys
+
+def merge_gallop (s1: Sequence, s2: Sequence, *,
+                  key: Callable = None, reverse: bool = False) -> Sequence:
+    """Merge two ordered sequences returning a third. Two cursors which
+    gallops when a sequence keeps winning (see _gallop_merge), so
+    merging runs with long stretches of not interleaved items is cheap."""
+    if reverse:
+        # merging the reversed sequences in the other order keeps it stable.
+        merged = merge_gallop(list(s2)[::-1], list(s1)[::-1], key=key)
+        merged.reverse()
+        return merged
+    lst1 = list(s1)
+    lst2 = list(s2)
+    keys1 = lst1 if key is None else list(map(key, lst1))
+    keys2 = lst2 if key is None else list(map(key, lst2))
+    return _gallop_merge(lst1, keys1, lst2, keys2)[0]
+
+def merge_sorted_n (s1: Sequence, s2: Sequence, *,
+                    key: Callable = None, reverse: bool = False) -> Sequence:
+    """Merge two ordered sequences of numbers returning a third, vectorised
+    with numpy: the positions of all the `s2` items in `s1` are found at once
+    with numpy.searchsorted, then inserted with numpy.insert (after the equal
+    items, so it's stable). Returns a list (of python numbers), like the other
+    merging functions. Falls back to merge_gallop if numpy is not available,
+    for a `key`, or if the sequences aren't homogeneous numbers (of the same
+    kind, to not lose precision)."""
+    if numpy is None or key is not None:
+        return merge_gallop(s1, s2, key=key, reverse=reverse)
+    try:
+        a1 = numpy.asarray(s1)
+        a2 = numpy.asarray(s2)
+    except (TypeError, ValueError): # i.e. sequences of different length
+        return merge_gallop(s1, s2, reverse=reverse)
+    if a1.ndim != 1 or a2.ndim != 1: # i.e. iterators (0-d object arrays)
+        return merge_gallop(s1, s2, reverse=reverse)
+    if not len(a1) or not len(a2):
+        return a2.tolist() if not len(a1) else a1.tolist()
+    if not (_is_numeric_array(a1) and _is_numeric_array(a2)
+            and a1.dtype.kind == a2.dtype.kind):
+        return merge_gallop(s1, s2, reverse=reverse)
+    if reverse:
+        # merging the reversed sequences in the other order keeps it stable.
+        return _merge_arrays(a2[::-1], a1[::-1])[::-1].tolist()
+    return _merge_arrays(a1, a2).tolist()
+
+def _merge_arrays (a1: Sequence, a2: Sequence) -> Sequence:
+    """merge_sorted_n for (ascending) numpy arrays of numbers of the same kind,
+    returning an array."""
+    dtype = numpy.result_type(a1, a2)
+    a1 = a1.astype(dtype, copy=False)
+    return numpy.insert(a1, numpy.searchsorted(a1, a2, side='right'), a2.astype(dtype, copy=False))
+
+def is_kway (func: Callable) -> bool:
+    """True if `func` accepts any number of sequences to merge."""
+    return any(p.kind == p.VAR_POSITIONAL
+               for p in inspect.signature(func).parameters.values())
 
 
 ########################
@@ -465,54 +805,75 @@ def merge_sorted_i (s1: Sequence, s2: Sequence) -> Iterable:
 
         
 #XXX+TODO?: change sign+impl: f(seq, ofunc=group_sort|sort_two|other..., mfunc=merge_sorted_*)
-def merge_sort (seq: Sequence, func: Callable = merge_sorted_g) -> Sequence:
+@keyed
+def merge_sort (seq: Sequence, func: Callable = merge_sorted_g, *,
+                key: Callable = None, reverse: bool = False) -> Sequence:
     """Merge-sort."""
     #reduce = functools.reduce
-    return list(functools.reduce(func, sort_two(seq), []))
+    return list(functools.reduce(with_keywords(func, key, reverse),
+                                 sort_two(seq, key=key, reverse=reverse), []))
 
-def merge_sort2 (seq: Sequence, func: Callable = merge_sorted_g) -> Sequence:
+@keyed
+def merge_sort2 (seq: Sequence, func: Callable = merge_sorted_g, *,
+                 key: Callable = None, reverse: bool = False) -> Sequence:
     """Merge-sort... take advantage from partial ordered seqs."""
     #reduce = functools.reduce
-    return list(functools.reduce(lambda a,b: list(func(a,b)), group_sort(seq), []))
+    merge = with_keywords(func, key, reverse)
+    return list(functools.reduce(lambda a,b: list(merge(a,b)),
+                                 group_sort(seq, key=key, reverse=reverse), []))
 
-def merge_sort3 (seq: Sequence, func: Callable = merge_sorted_i) -> Sequence:
+@keyed
+def merge_sort3 (seq: Sequence, func: Callable = merge_sorted_i, *,
+                 key: Callable = None, reverse: bool = False) -> Sequence:
     """merge sort...take advantage from partial ordered seqs."""
-    d = collections.deque(group_sort(seq))
+    merge = with_keywords(func, key, reverse)
+    d = collections.deque(group_sort(seq, key=key, reverse=reverse))
     if not d:
         return []
     while len(d) > 1:
         a = d.pop()
         b = d.pop()
-        d.append(list(func(a, b)))#d.appendleft(func(a, b))
+        d.append(list(merge(b, a)))#d.appendleft(func(a, b))
     assert len(d) == 1
     return d.pop()
 
-def merge_sort4 (seq: Sequence, func: Callable = merge_sorted_i) -> Sequence:
+@keyed
+def merge_sort4 (seq: Sequence, func: Callable = merge_sorted_i, *,
+                 key: Callable = None, reverse: bool = False) -> Sequence:
     """merge sort...take advantage from partial ordered seqs."""
+    merge = with_keywords(func, key, reverse)
     s = []
-    for a,b in takes_f(group_sort(seq), 2):
-        s.append(a if b is None else tuple(func(a,b)))
+    for a,b in takes_f(group_sort(seq, key=key, reverse=reverse), 2):
+        s.append(a if b is None else tuple(merge(a,b)))
     if not s:
         return []
     while len(s) > 1:
         ss = []
         for a,b in takes_f(s, 2):
-            ss.append(a if b is None else tuple(func(a,b)))
+            ss.append(a if b is None else tuple(merge(a,b)))
         if ss:
             s = ss
     return s[0]
 
-def _merge_sort5 (seq: Sequence, func : Callable = None) -> Sequence: # NOTE: func parameter not used
-    sorted_pairs = group_sorti(seq)
+@keyed
+def _merge_sort5 (seq: Sequence, func : Callable = None, *, # NOTE: func parameter not used
+                  key: Callable = None, reverse: bool = False) -> Sequence:
+    if reverse: # sort the reversed seq, then reverse it again to keep it stable
+        return _merge_sort5(list(seq)[::-1], key=key)[::-1]
+    sorted_pairs = group_sorti(seq, key=key)
     while True:
         s = []
         for p1, p2 in takes_f(sorted_pairs, 2, ()):
             m = p1 #list(p1)
+            mk = m if key is None else list(map(key, m))
             low = 0
             for p in p2:
-                idx = bisect.bisect_left(m, p, low)
-                bisect.insort_left(m, p, idx)
-                low = idx
+                k = p if key is None else key(p)
+                idx = bisect.bisect_right(mk, k, low)
+                m.insert(idx, p)
+                if mk is not m:
+                    mk.insert(idx, k)
+                low = idx + 1
             s.append(m)
         sorted_pairs = s
         if not s:
@@ -522,40 +883,515 @@ def _merge_sort5 (seq: Sequence, func : Callable = None) -> Sequence: # NOTE: fu
             break
     return sorted_pairs[0]
 
-def merge_sort5 (seq: Sequence, func : Callable = merge_sorted_b) -> Sequence:
-    return list(functools.reduce(lambda a,b: list(func(a,b)), group_sorti(seq), []))
+@keyed
+def merge_sort5 (seq: Sequence, func : Callable = merge_sorted_b, *,
+                 key: Callable = None, reverse: bool = False) -> Sequence:
+    merge = with_keywords(func, key, reverse)
+    return list(functools.reduce(lambda a,b: list(merge(a,b)),
+                                 group_sorti(seq, key=key, reverse=reverse), []))
+
+@keyed
+def merge_sort_k (seq: Sequence, func: Callable = merge_sorted_k, *,
+                  key: Callable = None, reverse: bool = False) -> Sequence:
+    """Merge-sort... merge all the runs from group_sorti at once, in O(n log r)
+    for r runs. `func` should be a k-way merging function (like merge_sorted_k),
+    two-way ones are used by merge_rounds."""
+    merge = with_keywords(func, key, reverse)
+    runs = group_sorti(seq, key=key, reverse=reverse)
+    if is_kway(func):
+        return list(merge(*runs))
+    return list(merge_rounds(merge, runs))
+
+
+@keyed
+def merge_sort_natural (seq: Sequence, func: Callable = merge_gallop, *,
+                        key: Callable = None, reverse: bool = False) -> Sequence:
+    """Adaptive natural merge-sort (the Timsort strategy): takes the runs
+    from natural_runs and merge them (using `func`, by default the galloping
+    merge) keeping a stack of pending runs with lengths growing like the
+    fibonacci numbers, so merges are balanced and still sorted or reversed
+    inputs are sorted in linear time."""
+    items = list(seq)
+    if reverse: # sort the reversed seq, then reverse it again to keep it stable
+        items.reverse()
+    if func is merge_gallop:
+        merge = _gallop_merge
+    else:
+        merge_func = with_keywords(func, key)
+        merge = lambda items1, keys1, items2, keys2: (list(merge_func(items1, items2)), None)
+    stack = []
+    def merge_at (n):
+        stack[n] = merge(*stack[n], *stack[n+1])
+        del stack[n+1]
+    for run in natural_runs(items, key=key):
+        stack.append(run)
+        while len(stack) > 1:
+            n = len(stack) - 2
+            if ((n > 0 and len(stack[n-1][0]) <= len(stack[n][0]) + len(stack[n+1][0]))
+                or (n > 1 and len(stack[n-2][0]) <= len(stack[n-1][0]) + len(stack[n][0]))):
+                if len(stack[n-1][0]) < len(stack[n+1][0]):
+                    n -= 1
+            elif len(stack[n][0]) > len(stack[n+1][0]):
+                break
+            merge_at(n)
+    while len(stack) > 1:
+        n = len(stack) - 2
+        if n > 0 and len(stack[n-1][0]) < len(stack[n+1][0]):
+            n -= 1
+        merge_at(n)
+    if not stack:
+        return []
+    items = stack[0][0]
+    if reverse:
+        items.reverse()
+    return items
+
+
+def is_numeric (seq: Sequence) -> bool:
+    """True if `seq` is an array.array or an one-dimensional
+    numpy.ndarray of numbers."""
+    if isinstance(seq, array.array):
+        return seq.typecode not in 'uw'
+    return numpy is not None and isinstance(seq, numpy.ndarray) and _is_numeric_array(seq)
+
+def _is_numeric_array (a: Sequence) -> bool:
+    return a.ndim == 1 and a.dtype.kind in 'biuf'
+
+def numeric_merge_sort (seq: Sequence, reverse: bool = False) -> Sequence:
+    """Merge-sort for arrays of numbers, vectorised with numpy (which must be
+    available): the natural runs of `seq` are found at once or, when they are
+    shorter than min_run_length(n) on average, blocks of that length are
+    sorted at once (a stable numpy.sort on the rows of a 2D view),
+    then the runs are merged in rounds (as merge_sorted_n does, but keeping
+    the arrays). Returns a numpy array."""
+    a = numpy.asarray(seq)
+    if reverse: # sort the reversed seq, then reverse it again to keep it stable
+        a = a[::-1]
+    size = len(a)
+    if size < 2:
+        return a.copy()
+    minrun = min_run_length(size)
+    breaks = numpy.flatnonzero(a[1:] < a[:-1]) + 1
+    if len(breaks) + 1 > size // minrun:
+        whole = size - size % minrun
+        runs = list(numpy.sort(a[:whole].reshape(-1, minrun), axis=1, kind='stable'))
+        if whole < size:
+            runs.append(numpy.sort(a[whole:], kind='stable'))
+    else:
+        runs = numpy.split(a, breaks)
+    while len(runs) > 1:
+        runs = [r1 if r2 is None else _merge_arrays(r1, r2) for r1, r2 in takes_f(runs, 2)]
+    return runs[0][::-1] if reverse else runs[0]
 
 
 ##########################################
 # for comparison, others sorting methods #
 ##########################################
 
-def bubble_sort (seq: IntSeq, func: Any = None) -> Sequence:
+def bubble_sort (seq: IntSeq, func: Any = None, *,
+                 key: Callable = None, reverse: bool = False) -> Sequence:
     """Bubble sort. `func` parameter ignored
-    (here just for compatibility with merge_sort* funcs)."""
+    (here just for compatibility with merge_sort* funcs).
+    If given, the keys are computed once, in a list swapped along with the items."""
     s = list(seq)
+    ks = s if key is None else list(map(key, s))
     for i in range(len(s)):
         for j in range((len(s)-1)):
-            if s[j] > s[j+1]:
+            if (ks[j] < ks[j+1]) if reverse else (ks[j] > ks[j+1]):
                 s[j], s[j+1] = s[j+1], s[j]
+                if ks is not s:
+                    ks[j], ks[j+1] = ks[j+1], ks[j]
     return s
 
-def heap_sort (seq: Sequence, func: Any = None) -> Sequence:
+def heap_sort (seq: Sequence, func: Any = None, *,
+               key: Callable = None, reverse: bool = False) -> Sequence:
     """Heap sort. `func` parameter ignored
     (here just for compatibility with merge_sort* funcs)."""
-    s = list(seq)
-    heapq.heapify(s)
-    return list(heapq.heappop(s) for _ in range(len(s)))
+    return list(heap_sorti(seq, key=key, reverse=reverse))
 
-def heap_sorti (seq: Sequence, func: Any = None) -> Iterable:
+def heap_sorti (seq: Sequence, func: Any = None, *,
+                key: Callable = None, reverse: bool = False) -> Iterable:
     """Heap sort. `func` parameter ignored
-    (here just for compatibility with merge_sort* funcs)."""
-    s = list(seq)
+    (here just for compatibility with merge_sort* funcs).
+    Stable: the heap entries are (key, index, item) tuples,
+    so equal keys are ordered by position."""
+    items = list(seq)
+    keys = items if key is None else map(key, items)
+    if reverse:
+        keys = map(_Reversed, keys)
+    s = list(zip(keys, range(len(items)), items))
     heapq.heapify(s)
     while s:
-        yield heapq.heappop(s)
+        yield heapq.heappop(s)[2]
     
 
+####################
+# Parallel sorting #
+####################
+
+def _sort_shared (args: tuple) -> None:
+    """Sort in place the [start:stop] items of the named shared memory
+    (an array of `typecode` numbers) using `sort_func`. Runs in the workers
+    of parallel_merge_sort."""
+    name, typecode, start, stop, sort_func = args
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf.cast(typecode)
+    try:
+        view[start:stop] = array.array(typecode, sort_func(view[start:stop]))
+    finally:
+        view.release()
+        shm.close()
+
+def _sort_keyed (args: tuple) -> list:
+    """Returns the indexes of the `keys` chunk (starting at `start`)
+    sorted on them using `sort_func`. Runs in the workers of parallel_merge_sort."""
+    keys, start, sort_func, reverse = args
+    return [start + i for i in sort_func(range(len(keys)), key=keys.__getitem__, reverse=reverse)]
+
+def parallel_merge_sort (seq: Sequence, func: Callable = merge_sorted_k, workers: int = None,
+                         typecode: str = None, sort_func: Callable = merge_sort_k, *,
+                         key: Callable = None, reverse: bool = False) -> Sequence:
+    """Merge-sort... sorts `workers` chunks of `seq` in a process pool
+    (default: os.cpu_count() processes) using `sort_func`, then merges
+    the sorted chunks (like merge_sort_k does with `func`).
+    For numbers, `typecode` (an array.array typecode) makes the chunks to be
+    sorted in place in a shared memory array, to avoid pickling the data.
+    If `key` is given (not supported with `typecode`) only the keys are sent
+    to the workers, which sorts the indexes of the items on them."""
+    if key is not None and typecode is not None:
+        raise ValueError('parallel_merge_sort: key is not supported with typecode')
+    workers = workers or os.cpu_count() or 1
+    if not isinstance(seq, Sequence):
+        seq = list(seq)
+    size = len(seq)
+    if not size:
+        return []
+    bounds = [(size*i//workers, size*(i+1)//workers) for i in range(workers)]
+    keys = None if key is None else list(map(key, seq))
+    merge_func = with_keywords(func, None if keys is None else keys.__getitem__, reverse)
+    if is_kway(func):
+        merge = lambda runs: merge_func(*runs)
+    else:
+        merge = functools.partial(merge_rounds, merge_func)
+    if keys is not None:
+        with multiprocessing.Pool(workers) as pool:
+            runs = pool.map(_sort_keyed, [(keys[start:stop], start, sort_func, reverse)
+                                          for start, stop in bounds])
+        return [seq[i] for i in merge(runs)]
+    sort_func = with_keywords(sort_func, None, reverse)
+    if typecode is None:
+        with multiprocessing.Pool(workers) as pool:
+            runs = pool.map(sort_func, (seq[start:stop] for start, stop in bounds))
+        return list(merge(runs))
+    data = array.array(typecode, seq)
+    nbytes = len(data) * data.itemsize
+    shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    view = shm.buf[:nbytes].cast(typecode)
+    runs = []
+    try:
+        view[:] = data
+        del data
+        with multiprocessing.Pool(workers) as pool:
+            pool.map(_sort_shared, [(shm.name, typecode, start, stop, sort_func)
+                                    for start, stop in bounds])
+        runs = [view[start:stop] for start, stop in bounds]
+        return list(merge(runs))
+    finally:
+        for run in runs:
+            run.release()
+        view.release()
+        shm.close()
+        shm.unlink()
+
+
+####################
+# External sorting #
+####################
+
+def write_run (run: Iterable, path: str, typecode: str = 'q', bufsize: int = 1 << 16) -> str:
+    """Write the numbers in `run` to `path` as binary array.array records
+    of the given `typecode`, `bufsize` items a time. Returns `path`."""
+    with open(path, 'wb') as out:
+        for chunk in takes(run, bufsize):
+            array.array(typecode, chunk).tofile(out)
+    return path
+
+def read_run (path: str, typecode: str = 'q', bufsize: int = 1 << 16) -> Iterable:
+    """Yields the numbers written by write_run in `path`,
+    reading `bufsize` items a time."""
+    with open(path, 'rb') as f:
+        while True:
+            buf = array.array(typecode)
+            try:
+                buf.fromfile(f, bufsize)
+            except EOFError: # partial read, buf has the remaining items
+                yield from buf
+                return
+            yield from buf
+
+def external_sort (seq: Iterable, func: Callable = merge_sort_k, typecode: str = 'q',
+                   chunk_size: int = 1 << 20, tmpdir: str = None,
+                   max_open: int = 64) -> Iterable:
+    """External merge sort, for numbers which doesn't fit in memory.
+    Reads `seq` in chunks of `chunk_size` items, sorts every chunk with the
+    in-memory sorting function `func`, writes the sorted runs in temporary
+    files (see write_run, `typecode` is the array.array typecode of the numbers)
+    in `tmpdir` (default: the system's one), then yields the sorted numbers
+    merging the runs with merge_sorted_k. At most `max_open` runs are merged
+    (so files are open) at a time: if there are more, groups of them are
+    merged in new runs first, in as many passes as needed.
+    Temporary files are removed when the iteration ends (or the iterator
+    is closed)."""
+    if max_open < 2:
+        raise ValueError('external_sort: max_open must be >= 2')
+    with tempfile.TemporaryDirectory(dir=tmpdir) as dirname:
+        runs = []
+        for n, chunk in enumerate(takes(seq, chunk_size)):
+            runs.append(write_run(func(chunk), os.path.join(dirname, f'run{n}'), typecode))
+        n = len(runs)
+        while len(runs) > max_open:
+            merged = []
+            for group in takes(runs, max_open):
+                merged.append(write_run(
+                    merge_sorted_k(*(read_run(path, typecode) for path in group)),
+                    os.path.join(dirname, f'run{n}'), typecode))
+                n += 1
+                for path in group:
+                    os.remove(path)
+            runs = merged
+        yield from merge_sorted_k(*(read_run(path, typecode) for path in runs))
+
+def external_sort_file (infile: str, outfile: str, typecode: str = 'q',
+                        chunk_size: int = 1 << 20, tmpdir: str = None,
+                        max_open: int = 64) -> None:
+    """Sort the numbers (one per line) in `infile` to `outfile` using external_sort.
+    Use '-' for the standard input/output."""
+    conv = float if typecode in 'fd' else int
+    bufsize = 1 << 20
+    inp = sys.stdin if infile == '-' else open(infile, buffering=bufsize)
+    out = sys.stdout if outfile == '-' else open(outfile, 'w', buffering=bufsize)
+    try:
+        numbers = map(conv, filter(str.strip, inp))
+        out.writelines(f'{n}\n' for n in external_sort(numbers, typecode=typecode,
+                                                       chunk_size=chunk_size, tmpdir=tmpdir,
+                                                       max_open=max_open))
+    finally:
+        if inp is not sys.stdin:
+            inp.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+#################
+# Merging files #
+#################
+
+def read_lines (path: str, bufsize: int = 1 << 20) -> Iterable:
+    """Yields the lines of the text file `path` ('-' for the standard input),
+    read `bufsize` bytes a time. Adds the missing newline to the last line."""
+    f = sys.stdin if path == '-' else open(path, buffering=bufsize)
+    try:
+        for line in f:
+            if line[-1:] != '\n':
+                line += '\n'
+            yield line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def line_key (field: int = None, numeric: bool = False) -> Callable:
+    """Returns a key function for lines: the whole line (without the newline)
+    or its `field` (1-based, split on whitespaces, '' if missing),
+    converted to float if `numeric`."""
+    if field is None:
+        get = lambda line: line.rstrip('\n')
+    else:
+        idx = field - 1
+        def get (line):
+            fields = line.split(None, field)
+            return fields[idx] if len(fields) > idx else ''
+    return (lambda line: float(get(line))) if numeric else get
+
+def merge_files (paths: Collection[str], key: Callable = None, out: Any = None,
+                 reverse: bool = False, bufsize: int = 1 << 20, blocksize: int = 1 << 12) -> Any:
+    """Merge the lines of the text files in `paths`, each one sorted on `key`
+    (in descending order if `reverse`) using merge_sorted_k, so only the
+    current line and the read buffer (of `bufsize` bytes) of every file are
+    kept in memory. If `out` is None returns an iterator over the merged
+    lines, else writes them to `out` (a path, '-' for the standard output,
+    or a file object) in blocks of `blocksize` lines, returning the number
+    of lines written."""
+    lines = merge_sorted_k(*(read_lines(path, bufsize) for path in paths),
+                           key=key, reverse=reverse)
+    if out is None:
+        return lines
+    if out == '-':
+        f = sys.stdout
+    elif isinstance(out, (str, os.PathLike)):
+        f = open(out, 'w', buffering=bufsize)
+    else:
+        f = out
+    count = 0
+    try:
+        for block in takes(lines, blocksize):
+            f.write(''.join(block))
+            count += len(block)
+    finally:
+        if f is not out and f is not sys.stdout:
+            f.close()
+    return count
+
+
+##############
+# Benchmarks #
+##############
+
+class Counted:
+    """Wraps a value, counting (in Counted.count) the ordering comparisons
+    made between the instances. To measure the sorting functions.
+    Equality tests are not counted: tuples (i.e. heap entries) call them on
+    their items before the ordering comparison which decides the result."""
+    __slots__ = ('value',)
+    count = 0
+    def __init__ (self, value):
+        self.value = value
+    def __lt__ (self, other):
+        Counted.count += 1
+        return self.value < other.value
+    def __le__ (self, other):
+        Counted.count += 1
+        return self.value <= other.value
+    def __gt__ (self, other):
+        Counted.count += 1
+        return self.value > other.value
+    def __ge__ (self, other):
+        Counted.count += 1
+        return self.value >= other.value
+    def __eq__ (self, other):
+        return self.value == other.value
+
+def count_comparisons (func: Callable, seq: Sequence) -> int:
+    """Returns the number of comparisons made by the sorting function
+    `func` for sorting `seq`."""
+    items = [Counted(v) for v in seq]
+    Counted.count = 0
+    result = list(func(items))
+    assert [c.value for c in result] == sorted(seq), f'{func.__name__}: not sorted'
+    return Counted.count
+
+def fit_exponent (sizes: Sequence[int], values: Sequence[float]) -> float:
+    """Returns the exponent `b` of the best fit of values = a * sizes**b
+    (least squares on the logarithms), nan if there are too few points."""
+    points = [(math.log(n), math.log(v)) for n, v in zip(sizes, values) if n > 0 and v > 0]
+    if len(points) < 2:
+        return math.nan
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    sxx = sum((x - mx) ** 2 for x, _ in points)
+    if not sxx:
+        return math.nan
+    return sum((x - mx) * (y - my) for x, y in points) / sxx
+
+def _bench_input (kind: str, size: int) -> list:
+    ri = random.randint
+    if kind == 'few-unique':
+        return [ri(0, 9) for _ in range(size)]
+    seq = [ri(-size*10, size*10) for _ in range(size)]
+    if kind in ('sorted', 'almost-sorted'):
+        seq.sort()
+        if kind == 'almost-sorted': # swaps 1% of the items
+            for _ in range(max(1, size // 100)):
+                i, j = random.randrange(size), random.randrange(size)
+                seq[i], seq[j] = seq[j], seq[i]
+    elif kind == 'reversed':
+        seq.sort(reverse=True)
+    elif kind != 'random':
+        raise ValueError(f'unknown input kind: {kind}')
+    return seq
+
+def _bench (sizes: Sequence[int] = BENCH_SIZES, inputs: Sequence[str] = BENCH_INPUTS,
+            names: Sequence[str] = BENCH_FUNCS_NAMES) -> list:
+    """Benchmark the sorting functions in `names` (the builtin sorted too)
+    for every input kind in `inputs` and every size in `sizes`, measuring the
+    time (timeit's autorange) and the comparisons made (see count_comparisons).
+    Returns a list of dicts (one for every name, input, size) with the results."""
+    import timeit
+    results = []
+    report = '{:20} {:14} {:>8} {:>12.6f}s {:>12} cmp'
+    for kind in inputs:
+        for size in sizes:
+            seq = _bench_input(kind, size)
+            for name in names:
+                if size > BENCH_MAX_SIZE.get(name, size):
+                    continue
+                func = sorted if name == 'sorted' else globals()[name]
+                number, total = timeit.Timer(lambda: list(func(seq))).autorange()
+                res = {'function': name, 'input': kind, 'size': size,
+                       'seconds': total/number, 'comparisons': count_comparisons(func, seq)}
+                print(report.format(name, kind, size, res['seconds'], res['comparisons']))
+                results.append(res)
+    return results
+
+def _bench_exponents (results: Collection[dict]) -> list:
+    """Returns a list of dicts with the growth exponents of the
+    time and the comparisons for every function and input kind of `results`."""
+    groups = collections.defaultdict(list)
+    for res in results:
+        groups[res['function'], res['input']].append(res)
+    exponents = []
+    for (name, kind), group in groups.items():
+        sizes = [res['size'] for res in group]
+        exponents.append({'function': name, 'input': kind,
+                          'time': fit_exponent(sizes, [res['seconds'] for res in group]),
+                          'comparisons': fit_exponent(sizes, [res['comparisons'] for res in group])})
+    return exponents
+
+def _bench_regressions (old: Collection[dict], new: Collection[dict],
+                        tolerance: float = BENCH_TOLERANCE,
+                        measures: Sequence[str] = ('comparisons',)) -> list:
+    """Returns the exponents of `new` (from _bench_exponents) which grows
+    more than `tolerance` from the ones of the same function and input in `old`,
+    as (function, input, measure, old exponent, new exponent) tuples.
+    By default checks only the comparisons, the time ones being too noisy."""
+    previous = dict(((e['function'], e['input']), e) for e in old)
+    regressions = []
+    for e in new:
+        prev = previous.get((e['function'], e['input']))
+        if prev is None:
+            continue
+        for measure in measures:
+            if e[measure] - prev[measure] > tolerance: # false if nan
+                regressions.append((e['function'], e['input'], measure, prev[measure], e[measure]))
+    return regressions
+
+def bench (sizes: Sequence[int] = BENCH_SIZES, inputs: Sequence[str] = BENCH_INPUTS,
+           names: Sequence[str] = BENCH_FUNCS_NAMES, save: str = None, compare: str = None) -> list:
+    """Runs _bench and prints the empirical growth exponents of time and
+    comparisons of every function and input kind (n log n shows as ~1.1,
+    quadratic as ~2). Saves results and exponents in the `save` JSON file,
+    if given. If `compare` (a file previously saved) is given reports the
+    comparisons exponents grown more than BENCH_TOLERANCE.
+    Returns the regressions found (see _bench_regressions)."""
+    results = _bench(sizes, inputs, names)
+    exponents = _bench_exponents(results)
+    print('*** Growth exponents (time ~ n**e, comparisons ~ n**e):')
+    for e in exponents:
+        print('{:20} {:14} time: {:5.2f}  comparisons: {:5.2f}'.format(
+            e['function'], e['input'], e['time'], e['comparisons']))
+    if save:
+        with open(save, 'w') as f:
+            json.dump({'sizes': list(sizes), 'results': results, 'exponents': exponents}, f, indent=1)
+    regressions = []
+    if compare:
+        with open(compare) as f:
+            regressions = _bench_regressions(json.load(f)['exponents'], exponents)
+        for name, kind, measure, old, new in regressions:
+            print(f'[REGRESSION] {name} ({kind}) {measure}: {old:.2f} -> {new:.2f}')
+        if not regressions:
+            print('*** No regressions')
+    return regressions
+
+
 #########
 # Tests #
 #########
@@ -565,6 +1401,18 @@ def _test_iter (seqs: Collection[Sequence]):
         it = Injecretor(s)
         for i in it:
             pass
+        it = Injecretor(s)
+        r = []
+        for i in it:
+            assert it.last == i, '[FAIL] Injecretor: last'
+            if it.peek(None) == i:
+                r.append(next(it))
+            r.append(i)
+        assert r == list(s), '[FAIL] Injecretor: peek'
+    it = Injecretor([2])
+    it.send(3)
+    it.send(4)
+    assert list(it) == [3, 4, 2], '[FAIL] Injecretor: send'
     print('Injecretor: OK')
 
 def _test_merged (fnames: Collection[str], lst: Collection[Pair[IntSeq, IntSeq]]):
@@ -574,8 +1422,239 @@ def _test_merged (fnames: Collection[str], lst: Collection[Pair[IntSeq, IntSeq]]
             r1 = list(f1(*pair))
             r2 = list(f2(*pair))
             assert r1 == r2, f'[FAIL]: {f1.__name__} <> {f2.__name}'
+    # merge_sorted_n: iterators, and python numbers when a side is empty
+    for s1, s2 in (([1, 3], [2]), ([], [1, 2]), ([1, 2], []), ([(0, 1)], [(0, 2)])):
+        r = merge_sorted_n(iter(s1), iter(s2))
+        assert r == sorted(s1 + s2), f'[FAIL] merge_sorted_n (iterators): {r}'
+    if numpy is not None:
+        for s1, s2 in ((numpy.array([1, 2]), []), ([], numpy.array([0.5])),
+                       (numpy.array([1, 2]), numpy.array([], dtype=int))):
+            r = merge_sorted_n(s1, s2)
+            assert all(type(x) in (int, float) for x in r), f'[FAIL] merge_sorted_n (empty side): {r!r}'
     print('assert (merge): OK')
 
+def _test_kmerge (merge_names: Collection[str], seqs: Collection[Sequence]):
+    runs = list(sorted(s) for s in seqs)
+    expected = sorted(itertools.chain.from_iterable(runs))
+    for name in merge_names:
+        func = globals()[name]
+        if is_kway(func):
+            r = list(func(*runs))
+        else:
+            r = list(merge_rounds(func, runs))
+        assert r == expected, f'[FAIL] (k-way) {name} <> builtin sorted()'
+    assert list(merge_sorted_k()) == [], '[FAIL] merge_sorted_k() <> []'
+    print('assert (k-way merge): OK')
+
+
+def _test_keyed (msort_names: Collection[str], merge_names: Collection[str],
+                 other_names: Collection[str], group_names: Collection[str]):
+    ri = random.randint
+    key = operator.itemgetter(0)
+    calls = 0
+    def counted (item):
+        nonlocal calls
+        calls += 1
+        return item[0]
+    # records with many ties, to check stability
+    recs = [[(ri(-20, 20), n) for n in range(ri(0, 300))] for _ in range(20)]
+    for lst in recs:
+        for reverse in (False, True):
+            expected = sorted(lst, key=key, reverse=reverse)
+            for sname, mname in itertools.product(msort_names, merge_names):
+                calls = 0
+                r = list(globals()[sname](lst, globals()[mname], key=counted, reverse=reverse))
+                assert r == expected, f'[FAIL] (key) {sname}({mname}, reverse={reverse})'
+                assert calls == len(lst), f'[FAIL] (key) {sname}({mname}): {calls} key calls'
+            for name in other_names:
+                if name == 'bubble_sort' and len(lst) > 100:
+                    continue
+                r = list(globals()[name](lst, key=key, reverse=reverse))
+                assert r == expected, f'[FAIL] (key) {name}(reverse={reverse})'
+            r = list(heap_sorti([k for k, _ in lst], reverse=reverse))
+            assert r == [k for k, _ in expected], f'[FAIL] (key) heap_sorti(reverse={reverse})'
+            runs = [r for r in group_sorti(lst, key=key, reverse=reverse)]
+            assert list(itertools.chain.from_iterable(runs)) == lst, '[FAIL] (key) group_sorti'
+            for run in runs:
+                assert run == sorted(run, key=key, reverse=reverse), '[FAIL] (key) group_sorti: run'
+            for name in group_names:
+                r = list(globals()[name](lst, key=key, reverse=reverse))
+                assert r == runs, f'[FAIL] (key) {name} <> group_sorti (reverse={reverse})'
+            half = len(lst) // 2
+            s1 = sorted(lst[:half], key=key, reverse=reverse)
+            s2 = sorted(lst[half:], key=key, reverse=reverse)
+            for name in merge_names:
+                r = list(globals()[name](s1, s2, key=key, reverse=reverse))
+                assert r == expected, f'[FAIL] (key) {name}(reverse={reverse})'
+    lst = recs[0] + [(ri(-20, 20), n) for n in range(1000)]
+    for reverse in (False, True):
+        r = parallel_merge_sort(lst, workers=3, key=key, reverse=reverse)
+        assert r == sorted(lst, key=key, reverse=reverse), f'[FAIL] (key) parallel_merge_sort(reverse={reverse})'
+    print('assert (key, reverse): OK')
+
+def _test_natural (merge_names: Collection[str]):
+    ri = random.randint
+    for _ in range(200):
+        keys = sorted(ri(-50, 50) for _ in range(ri(0, 100)))
+        for x in range(-52, 53, 3):
+            lo = ri(0, len(keys))
+            hi = ri(lo, len(keys))
+            assert gallop_right(keys, x, lo, hi) == bisect.bisect_right(keys, x, lo, hi), '[FAIL] gallop_right'
+            assert gallop_left(keys, x, lo, hi) == bisect.bisect_left(keys, x, lo, hi), '[FAIL] gallop_left'
+    for n, minrun in ((0, 0), (63, 63), (64, 32), (65, 33), (2**20, 32), (2**20+1, 33)):
+        assert min_run_length(n) == minrun, f'[FAIL] min_run_length({n}) != {minrun}'
+    size = 5000
+    rnd = [ri(-size, size) for _ in range(size)]
+    inputs = {
+        'sorted': sorted(rnd),
+        'reversed': sorted(rnd, reverse=True),
+        'sawtooth': list(itertools.chain.from_iterable(range(0, 100, k) for k in range(1, size//20))),
+        'few unique': [ri(0, 3) for _ in range(size)],
+        'almost sorted': sorted(rnd)[:-10] + rnd[:10],
+        'random': rnd,
+        }
+    for name, lst in inputs.items():
+        for func in (merge_gallop, *(globals()[f] for f in merge_names)):
+            for reverse in (False, True):
+                r = merge_sort_natural(lst, func, reverse=reverse)
+                assert r == sorted(lst, reverse=reverse), f'[FAIL] merge_sort_natural ({name}, {func.__name__})'
+    # strictly descending runs are reversed as a whole, not split on ties
+    assert len(list(natural_runs(inputs['sorted']))) == 1, '[FAIL] natural_runs (sorted)'
+    assert len(list(natural_runs(range(size, 0, -1)))) == 1, '[FAIL] natural_runs (descending)'
+    runs = list(natural_runs([3, 3, 2, 2, 1], minrun=1))
+    assert [r for r, _ in runs] == [[3, 3], [2, 2], [1]], f'[FAIL] natural_runs (ties): {runs}'
+    runs = list(natural_runs([1, 2, 2, 0, 5, 4], minrun=1))
+    assert [r for r, _ in runs] == [[1, 2, 2], [0, 5], [4]], f'[FAIL] natural_runs (ascending): {runs}'
+    # every pair of adjacent items is compared once at most
+    for lst in (inputs['sorted'], list(range(size, 0, -1))):
+        items = [Counted(v) for v in lst]
+        Counted.count = 0
+        list(natural_runs(items))
+        assert Counted.count == size - 1, f'[FAIL] natural_runs: {Counted.count} comparisons'
+    print('assert (natural merge-sort): OK')
+
+def _test_numeric (msort_names: Collection[str]):
+    if numpy is None:
+        print('assert (numeric merge-sort): SKIPPED (numpy not available)')
+        return
+    ri = random.randint
+    for size in (0, 1, 2, 63, 64, 65, 1000, 10007):
+        ints = [ri(-size, size) for _ in range(size)]
+        floats = [random.random() for _ in range(size)]
+        for seq in (array.array('q', ints), array.array('d', floats),
+                    numpy.array(ints), numpy.array(sorted(floats)),
+                    numpy.array(sorted(ints, reverse=True), dtype=numpy.int32)):
+            for reverse in (False, True):
+                expected = sorted(seq.tolist(), reverse=reverse)
+                r = numeric_merge_sort(seq, reverse)
+                assert r.dtype == numpy.asarray(seq).dtype, f'[FAIL] numeric_merge_sort: dtype {r.dtype}'
+                assert r.tolist() == expected, f'[FAIL] numeric_merge_sort ({size}, reverse={reverse})'
+                for name in msort_names:
+                    r = globals()[name](seq, reverse=reverse)
+                    assert r == expected, f'[FAIL] {name} (numeric, {size}, reverse={reverse})'
+    for s1, s2 in (([], [1, 2]), ([1, 3], []), ([1, 3, 5], [2.5, 3.0]), ([(1, 2)], [(0, 1)]),
+                   ([2**70], [1, 3]), (['a', 'c'], ['b']), ([1, 3, 5], [3, 4, 6, 7])):
+        for reverse in (False, True):
+            a, b = (s1[::-1], s2[::-1]) if reverse else (s1, s2)
+            r = merge_sorted_n(a, b, reverse=reverse)
+            assert type(r) is list, f'[FAIL] merge_sorted_n: returns {type(r)}'
+            assert r == merge_sorted_g(a, b, reverse=reverse), f'[FAIL] merge_sorted_n: {s1} {s2}'
+    # lists of python numbers, also when merging arrays or in merge_sort*
+    for r in (merge_sorted_n(numpy.array([1, 3]), numpy.array([2])),
+              merge_sort_k(list(range(50, 0, -1)), merge_sorted_n),
+              merge_sort2([0.5, 0.25, 1.0], merge_sorted_n)):
+        assert type(r) is list and all(type(x) in (int, float) for x in r), f'[FAIL] merge_sorted_n: {r!r}'
+        json.dumps(r)
+    # an explicit merging function is used for arrays too
+    calls = []
+    def merge_spy (s1, s2, **kw):
+        calls.append(1)
+        return merge_sorted_g(s1, s2, **kw)
+    assert merge_sort(array.array('q', [3, 1, 2]), merge_spy) == [1, 2, 3] and calls, '[FAIL] keyed: func ignored'
+    # mixed ints and floats aren't converted (big ints would lose precision)
+    assert list(merge_sorted_n([2**53 + 1], [0.5]))[-1] == 2**53 + 1, '[FAIL] merge_sorted_n: int precision'
+    print('assert (numeric merge-sort): OK')
+
+def _test_parallel (merge_names: Collection[str]):
+    ri = random.randint
+    for length in (0, 1, 2, 999, 10001):
+        lst = [ri(-2**40, 2**40) for _ in range(length)]
+        flst = [random.random() for _ in range(length)]
+        rs = sorted(lst)
+        for workers in (1, 3):
+            for name in merge_names:
+                r = parallel_merge_sort(lst, globals()[name], workers)
+                assert r == rs, f'[FAIL] parallel_merge_sort ({name}, workers={workers})'
+            r = parallel_merge_sort(lst, workers=workers, typecode='q')
+            assert r == rs, f'[FAIL] parallel_merge_sort (shared, workers={workers})'
+            r = parallel_merge_sort(flst, workers=workers, typecode='d', sort_func=heap_sort)
+            assert r == sorted(flst), f'[FAIL] parallel_merge_sort (shared, float, workers={workers})'
+    print('assert (parallel merge-sort): OK')
+
+def _test_external ():
+    ri = random.randint
+    for typecode, make in (('q', lambda: ri(-2**40, 2**40)), ('d', random.random)):
+        for length in (0, 1, 999, 1000, 10001):
+            lst = [make() for _ in range(length)]
+            for chunk_size in (1, 7, 1000, 20000):
+                r = list(external_sort(iter(lst), typecode=typecode, chunk_size=chunk_size))
+                assert r == sorted(lst), f'[FAIL] external_sort ({typecode}, {length}, {chunk_size})'
+            for max_open in (2, 3, 5):
+                r = list(external_sort(iter(lst), typecode=typecode, chunk_size=97, max_open=max_open))
+                assert r == sorted(lst), f'[FAIL] external_sort ({typecode}, {length}, max_open={max_open})'
+    with tempfile.TemporaryDirectory() as dirname:
+        lst = [ri(-1000, 1000) for _ in range(5000)]
+        infile = os.path.join(dirname, 'in')
+        outfile = os.path.join(dirname, 'out')
+        with open(infile, 'w') as f:
+            f.write('\n'.join(map(str, lst)))
+        external_sort_file(infile, outfile, chunk_size=99, max_open=4)
+        with open(outfile) as f:
+            assert list(map(int, f)) == sorted(lst), '[FAIL] external_sort_file'
+    print('assert (external sort): OK')
+
+def _test_merge_files ():
+    ri = random.randint
+    with tempfile.TemporaryDirectory() as dirname:
+        for key, make in ((None, lambda: f'line {ri(0, 10**6):07d}'),
+                          (line_key(1, True), lambda: f'{random.uniform(-1e6, 1e6)} n{ri(0, 9)}'),
+                          (line_key(2), lambda: f'host{ri(0, 9)} 2025-01-{ri(1, 31):02d}T{ri(0, 23):02d}')):
+            for reverse in (False, True):
+                paths = []
+                for n in range(ri(1, 12)):
+                    lines = sorted((make() for _ in range(ri(0, 2000))), key=key, reverse=reverse)
+                    paths.append(os.path.join(dirname, f'in{n}'))
+                    with open(paths[-1], 'w') as f:
+                        f.write('\n'.join(lines)) # no newline at the end
+                expected = sorted(itertools.chain.from_iterable(read_lines(path) for path in paths),
+                                  key=key, reverse=reverse)
+                r = list(merge_files(paths, key, reverse=reverse))
+                assert r == expected, f'[FAIL] merge_files (reverse={reverse})'
+                outfile = os.path.join(dirname, 'out')
+                count = merge_files(paths, key, outfile, reverse, blocksize=999)
+                with open(outfile) as f:
+                    assert f.readlines() == expected, f'[FAIL] merge_files (out, reverse={reverse})'
+                assert count == len(expected), f'[FAIL] merge_files: {count} lines written'
+    assert list(merge_files([])) == [], '[FAIL] merge_files([])'
+    print('assert (merge files): OK')
+
+def _test_bench ():
+    assert round(fit_exponent([1, 2, 4, 8], [3, 12, 48, 192]), 6) == 2, '[FAIL] fit_exponent'
+    assert math.isnan(fit_exponent([10], [1])), '[FAIL] fit_exponent (one point)'
+    seq = list(range(1000))
+    assert count_comparisons(sorted, seq) == len(seq) - 1, '[FAIL] count_comparisons (sorted)'
+    assert count_comparisons(sorted, seq[::-1]) == len(seq) - 1, '[FAIL] count_comparisons (reversed)'
+    # tuples (heap entries) comparisons count once
+    a, b = Counted(1), Counted(2)
+    Counted.count = 0
+    assert (a, 0) < (b, 1) and not (b, 0) < (a, 1) and Counted.count == 2, '[FAIL] Counted (tuples)'
+    for kind in BENCH_INPUTS:
+        assert len(_bench_input(kind, 99)) == 99, f'[FAIL] _bench_input ({kind})'
+    old = [{'function': 'f', 'input': 'random', 'time': 1.1, 'comparisons': 1.1}]
+    new = [{'function': 'f', 'input': 'random', 'time': 1.2, 'comparisons': 2.0}]
+    assert _bench_regressions(old, new) == [('f', 'random', 'comparisons', 1.1, 2.0)], '[FAIL] _bench_regressions'
+    print('assert (bench): OK')
+
 
 def _test_msort (msort_names, merge_names, other_names, compare_others: bool):
     ri = random.randint
@@ -682,7 +1761,15 @@ def _test (config, parsed_cmdline):
         # test merging
         print('*** Test merging...')
         _test_merged(p.merge_funcs, lsts[:2])
+        _test_kmerge(p.merge_funcs, ichain(lstr[:5]))
         _test_msort(p.msort_funcs, p.merge_funcs, p.other_sort_funcs, p.other_cmp)
+        _test_natural(p.merge_funcs)
+        _test_numeric(p.msort_funcs)
+        _test_keyed(p.msort_funcs, p.merge_funcs, p.other_sort_funcs, p.group_funcs)
+        _test_parallel(p.merge_funcs)
+        _test_external()
+        _test_merge_files()
+        _test_bench()
         ###########################
         # test grouping and sorting
         print('*** Test grouping...')
@@ -792,6 +1879,14 @@ def check_parser (p, parser):
         parser.error('constrain violation: len < 1')
     if p.repeat < 1:
         parser.error('constrain violation: repeat < 1')
+    if p.chunk_size < 1:
+        parser.error('constrain violation: chunk-size < 1')
+    if p.max_open < 2:
+        parser.error('constrain violation: max-open < 2')
+    if any(size < 1 for size in p.bench_sizes):
+        parser.error('constrain violation: bench-sizes < 1')
+    if p.field is not None and p.field < 1:
+        parser.error('constrain violation: field < 1')
 
 def get_parsed(test_config):
     c = test_config
@@ -816,6 +1911,40 @@ def get_parsed(test_config):
     p.add_argument('-C', '--compare-with', dest='other_cmp', action='store_true', help='(test) compare with others sorting functions')
     p.add_argument('-O', '--other-funcs', dest='other_sort_funcs', choices=OTHER_SORT_FUNC_NAMES, nargs='+', default=OTHER_SORT_FUNC_NAMES,
                    metavar='NAME', help='other sort functions to test (when using the -C option), choice from: %(choices)s. Default: all.')
+    p.add_argument('-X', '--external-sort', dest='external', nargs=2, metavar=('INFILE', 'OUTFILE'),
+                   help='sort the numbers (one per line) from INFILE to OUTFILE ("-" for stdin/stdout) with external_sort, then quit')
+    p.add_argument('--chunk-size', dest='chunk_size', type=int, default=1 << 20, metavar='N',
+                   help='(external sort) numbers sorted in memory at a time (default: %(default)s)')
+    p.add_argument('--max-open', dest='max_open', type=int, default=64, metavar='N',
+                   help='(external sort) sorted runs merged (files open) at a time (default: %(default)s)')
+    p.add_argument('--typecode', dest='typecode', choices='bBhHiIlLqQfd', default='q',
+                   help='(external sort) array typecode of the numbers (default: %(default)s)')
+    p.add_argument('--tmpdir', dest='tmpdir', metavar='DIR', default=None,
+                   help='(external sort) directory for the temporary files (default: system dependent)')
+    p.add_argument('-K', '--merge-files', dest='merge_files', nargs='+', metavar='FILE',
+                   help='merge the sorted lines of the FILEs ("-" for stdin) with merge_files, then quit')
+    p.add_argument('-o', '--output', dest='output', default='-', metavar='OUTFILE',
+                   help='(merge files) output file (default: stdout)')
+    p.add_argument('--field', dest='field', type=int, default=None, metavar='N',
+                   help='(merge files) compare the N-th (1-based) field of the lines (default: the whole line)')
+    p.add_argument('--numeric', dest='numeric', action='store_true',
+                   help='(merge files) compare lines (or fields) as numbers')
+    p.add_argument('--reverse', dest='reverse', action='store_true',
+                   help='(merge files) the files are sorted in descending order')
+    p.add_argument('-b', '--bench', dest='bench', action='store_true',
+                   help='benchmark the sorting functions (growth of time and comparisons), then quit')
+    p.add_argument('-B', '--bench-funcs', dest='bench_funcs', nargs='+', metavar='NAME',
+                   choices=BENCH_FUNCS_NAMES, default=BENCH_FUNCS_NAMES,
+                   help='(bench) sorting functions, choice from: %(choices)s. Default: all.')
+    p.add_argument('-I', '--bench-inputs', dest='bench_inputs', nargs='+', metavar='KIND',
+                   choices=BENCH_INPUTS, default=BENCH_INPUTS,
+                   help='(bench) input kinds, choice from: %(choices)s. Default: all.')
+    p.add_argument('-S', '--bench-sizes', dest='bench_sizes', nargs='+', metavar='N',
+                   type=int, default=BENCH_SIZES, help='(bench) input sizes (default: %(default)s)')
+    p.add_argument('--save', dest='bench_save', metavar='FILE',
+                   help='(bench) save the results (as JSON) to FILE')
+    p.add_argument('--compare', dest='bench_compare', metavar='FILE',
+                   help='(bench) report the growth exponents worse than the ones saved in FILE')
     p.add_argument('-q', '--quit', dest='quit', action='store_true', help='quit after tests')
     p.add_argument('-d', '--debug', dest='debug', action='store_true', help='print debug info (tests only)')
     p.add_argument('-s', '--stats', dest='stats', action='store_true', help='print some stat (tests only)')    
@@ -835,6 +1964,15 @@ if __name__ == '__main__':
     check_parser(p, parser)
     for k,v in c.as_dict().items():
         c[k] = getattr(p, k)
+    if p.external:
+        external_sort_file(*p.external, p.typecode, p.chunk_size, p.tmpdir, p.max_open)
+        sys.exit(0)
+    if p.bench:
+        regressions = bench(p.bench_sizes, p.bench_inputs, p.bench_funcs, p.bench_save, p.bench_compare)
+        sys.exit(1 if regressions else 0)
+    if p.merge_files:
+        merge_files(p.merge_files, line_key(p.field, p.numeric), p.output, p.reverse)
+        sys.exit(0)
     if p.test_time or p.test_funcs:
         _test(c, p)
         if p.quit:
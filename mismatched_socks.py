@@ -18,22 +18,55 @@
 # along with this program; if not see <http://www.gnu.org/licenses/>   
 
 
+import array
+import bisect
 from collections.abc import Callable, Sequence
 import datetime
+from fractions import Fraction
+import heapq
 import itertools
+import math
 from numbers import Number
 import operator
 from typing import Iterator, List
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_NODEFAULT = object()
+_NUMERIC_TYPECODES = 'bBhHiIlLqQfd'
+
+
+def _as_date (date: datetime.date|str, name: str) -> datetime.date:
+    if not isinstance(date, (datetime.date, str)):
+        raise ValueError(f"wrong date type for {name}: '{date}'")
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    return date
+
 
 def date_range (start: datetime.date|str,
                 end: datetime.date|str,
-                filter: Callable = lambda x:True,
-                include_end: bool = True) -> Sequence[datetime.date, ...]:
+                filter: Callable = None,
+                include_end: bool = True,
+                step: int|datetime.timedelta = 1,
+                weekdays: Sequence[int] = None,
+                lazy: bool = False,
+                as_array: bool = False) -> Sequence[datetime.date, ...]:
     """
     Returns a sequence of date objects from $start to $end (included, $include_end default to True).
     $start and $end can be datetime.date objects or string in iso format like 'YYYY-MM-DD'.
     $filter is a callable to filter the produced datetime.date objects.
+    $step is the number of days (int or datetime.timedelta) between the dates,
+    negative for going backward from $start to $end.
+    $weekdays, if given, are the weekday() numbers (0 is Monday) of the dates to keep:
+    computed from the week cycle, without a call for every date.
+    If $lazy is true returns an iterator instead of a list.
+    If $as_array is true (numpy required) returns a numpy datetime64[D] array,
+    computed at once, $filter then is called once with the whole array
+    and must returns a boolean mask.
     >>> date_range('2026-05-11', datetime.date(2026, 5, 14))
     [datetime.date(2026, 5, 11), datetime.date(2026, 5, 12), datetime.date(2026, 5, 13), datetime.date(2026, 5, 14)]
     >>> date_range(datetime.date(2026, 5, 11), '2026-05-14', include_end=False)
@@ -42,28 +75,131 @@ def date_range (start: datetime.date|str,
     [datetime.date(2026, 5, 11), datetime.date(2026, 5, 14)]
     >>> date_range('2026-05-11', datetime.date(2026, 5, 1))
     []
+    >>> date_range('2026-05-11', '2026-05-01', step=-4)
+    [datetime.date(2026, 5, 11), datetime.date(2026, 5, 7), datetime.date(2026, 5, 3)]
+    >>> date_range('2026-05-01', '2026-05-12', weekdays=(5, 6))
+    [datetime.date(2026, 5, 2), datetime.date(2026, 5, 3), datetime.date(2026, 5, 9), datetime.date(2026, 5, 10)]
+    >>> next(date_range('2026-05-01', '9999-12-31', step=datetime.timedelta(weeks=1), lazy=True))
+    datetime.date(2026, 5, 1)
     """
-    if not isinstance(start, (datetime.date, str)):
-        raise ValueError(f"wrong date type for start: '{start}'")
-    if isinstance(start, str):
-        start = datetime.date.fromisoformat(start)
-    if not isinstance(end, (datetime.date, str)):
-        raise ValueError(f"wrong date type for end: '{end}'")
-    if isinstance(end, str):
-        end = datetime.date.fromisoformat(end)
-    end += datetime.timedelta(include_end)
-    dates = []
-    while start < end:
-        if filter(start):
-            dates.append(start)
-        start += datetime.timedelta(1)
-    return dates
-
-
-def frange (start: Number, stop: Number, step: Number=1) -> Iterator[Number]:
+    start = _as_date(start, 'start')
+    end = _as_date(end, 'end')
+    if isinstance(step, datetime.timedelta):
+        if step % datetime.timedelta(1):
+            raise ValueError(f"step must be whole days: '{step}'")
+        step = step.days
+    if step == 0:
+        raise ValueError('*step* must not be zero')
+    # exclusive end, in days from $start
+    stop = (end - start).days + (include_end if step > 0 else -include_end)
+    if as_array:
+        if numpy is None:
+            raise ImportError('date_range: as_array needs numpy')
+        dates = numpy.arange(numpy.datetime64(start, 'D'),
+                             numpy.datetime64(start, 'D') + stop, step)
+        if weekdays is not None:
+            # 1970-01-01 (day 0) was a Thursday
+            dates = dates[numpy.isin((dates.astype('int64') + 3) % 7, list(weekdays))]
+        if filter is not None:
+            dates = dates[filter(dates)]
+        return dates
+    count = max(0, -(-stop // step))
+    if weekdays is None:
+        idxs = range(count)
+    else:
+        # the weekdays repeats every $cycle dates
+        cycle = 7 // math.gcd(step, 7)
+        wd = start.weekday()
+        keep = [j for j in range(cycle) if (wd + j * step) % 7 in weekdays]
+        idxs = (i + j for i in range(0, count, cycle) for j in keep if i + j < count)
+    first = start.toordinal()
+    dates = (datetime.date.fromordinal(first + i * step) for i in idxs)
+    if filter is not None:
+        dates = (date for date in dates if filter(date))
+    return dates if lazy else list(dates)
+
+
+class FRange (Sequence):
     """
-    Range function yielding values from $start to $stop (excluded) by $step,
-    supporting any Number arguments.
+    The sequence of the $count numbers $start + i * $step (see frange),
+    supporting len() and indexing (slices too) like range objects.
+    """
+    __slots__ = ('start', 'step', '_count')
+    def __init__ (self, start: Number, step: Number, count: int):
+        self.start = start
+        self.step = step
+        self._count = count
+    @property
+    def stop (self):
+        return self.start + self._count * self.step
+    def __len__ (self):
+        return self._count
+    def __getitem__ (self, index):
+        if isinstance(index, slice):
+            r = range(self._count)[index]
+            return FRange(self.start + r.start * self.step, self.step * r.step, len(r))
+        index = operator.index(index)
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('frange object index out of range')
+        return self.start + index * self.step
+    def __iter__ (self):
+        start, step = self.start, self.step
+        return (start + i * step for i in range(self._count))
+    def __repr__ (self):
+        return f'frange({self.start!r}, {self.stop!r}, {self.step!r})'
+    def _values (self):
+        # what defines the sequence of values, as range does
+        if self._count == 0:
+            return (0, None, None)
+        if self._count == 1:
+            return (1, self.start, None)
+        return (self._count, self.start, self.step)
+    def __eq__ (self, other):
+        if not isinstance(other, FRange):
+            return NotImplemented
+        return self._values() == other._values()
+    def __hash__ (self):
+        return hash(self._values())
+    def as_array (self):
+        """Returns the numbers as a numpy array (numpy required),
+        of objects for non float/int numbers (i.e. Fraction and Decimal)."""
+        if numpy is None:
+            raise ImportError('frange: as_array needs numpy')
+        if all(isinstance(n, (int, float)) for n in (self.start, self.step)):
+            return numpy.arange(self._count) * self.step + self.start
+        return numpy.array(list(self), dtype=object)
+
+
+def _is_finite (n: Number) -> bool:
+    if hasattr(n, 'is_finite'): # Decimal, which may not fit in a float
+        return n.is_finite()
+    try:
+        return math.isfinite(n)
+    except OverflowError: # ints and Fractions too big for a float
+        return True
+
+
+def frange (start: Number, stop: Number, step: Number=1, as_array: bool = False) -> FRange:
+    """
+    Range function for the values from $start to $stop (excluded) by $step,
+    supporting any Number arguments. Values are computed as $start + i * $step,
+    so without accumulated errors (and exact for Fraction or Decimal arguments).
+    Returns a FRange sequence or, if $as_array is true, a numpy array.
+    If an argument is not finite (i.e. float('inf') or nan) returns
+    a generator of the values instead (raise ValueError if $as_array
+    is true).
+    >>> list(frange(0, 1, 0.1))[-1]
+    0.9
+    >>> from fractions import Fraction
+    >>> r = frange(0, 1, Fraction(1, 3))
+    >>> len(r), r[-1], list(r[::2])
+    (3, Fraction(2, 3), [Fraction(0, 1), Fraction(2, 3)])
+    >>> frange(2, -1, -0.5)
+    frange(2, -1.0, -0.5)
+    >>> list(itertools.islice(frange(0, float('inf'), 2), 4))
+    [0, 2, 4, 6]
     """
     if step == 0:
         raise ValueError('*step* must not be zero')
@@ -71,12 +207,85 @@ def frange (start: Number, stop: Number, step: Number=1) -> Iterator[Number]:
         cmp = operator.gt
     else:
         cmp = operator.lt
-    while cmp(start, stop):
-        yield start
-        start += step
+    if not all(map(_is_finite, (start, stop, step))):
+        if as_array:
+            raise ValueError('frange: as_array needs finite arguments')
+        return itertools.takewhile(lambda v: cmp(v, stop),
+                                   (start + i * step for i in itertools.count()))
+    if any(isinstance(n, float) for n in (start, stop, step)):
+        count = max(0, math.ceil((stop - start) / step))
+        # fix float rounding, so the values are exactly the ones less than $stop
+        while count and not cmp(start + (count - 1) * step, stop):
+            count -= 1
+        while cmp(start + count * step, stop):
+            count += 1
+    else:
+        # exact, for any size (i.e. big ints, Fraction and Decimal)
+        start_, stop_, step_ = map(Fraction, (start, stop, step))
+        count = max(0, -((start_ - stop_) // step_))
+    r = FRange(start, step, count)
+    return r.as_array() if as_array else r
+
+
+class _Reversed:
+    """Wraps $value reversing the order, for min-heaps acting as max-heaps."""
+    __slots__ = ('value',)
+    def __init__ (self, value):
+        self.value = value
+    def __lt__ (self, other):
+        return other.value < self.value
+    def __eq__ (self, other):
+        return self.value == other.value
+
+
+def _mad_top (iterable, default, key, k, largest):
+    if k < 1:
+        raise ValueError(f'k must be positive, not {k}')
+    better = operator.gt if largest else operator.lt
+    iterable = iter(iterable)
+    if k == 1:
+        # no hashing here, so keys need only to be comparable
+        founds = []
+        try:
+            first = next(iterable)
+            best = key(first)
+            founds.append(first)
+        except StopIteration:
+            return default
+        for item in iterable:
+            this = key(item)
+            if better(this, best):
+                best = this
+                founds = [item]
+            elif best == this:
+                founds.append(item)
+        return founds
+    # heap of the (at most) $k best keys, worst on top, as
+    # [sortkey, key, bucket] where bucket holds the items.
+    wrap = (lambda x: x) if largest else _Reversed
+    heap = []
+    buckets = {}
+    for item in iterable:
+        this = key(item)
+        if len(heap) == k and better(heap[0][1], this):
+            continue
+        bucket = buckets.get(this)
+        if bucket is not None:
+            bucket.append(item)
+            continue
+        buckets[this] = bucket = [item]
+        entry = [wrap(this), this, bucket]
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        else:
+            del buckets[heapq.heapreplace(heap, entry)[1]]
+    if not heap:
+        return default
+    heap.sort(reverse=True)
+    return list(itertools.chain.from_iterable(bucket for _, _, bucket in heap))
 
 
-def mad_max (iterable, default=(), key=lambda x:x):
+def mad_max (iterable, default=(), key=lambda x:x, k=1):
     """
     Return the biggest ITEMS from *iterable*.
     *default* specifies an object to return if
@@ -84,6 +293,10 @@ def mad_max (iterable, default=(), key=lambda x:x):
     *key* is a callable applied on every item, the results
     of key(item) is used for the comparison (default to
     the identity function).
+    *k* is the number of the biggest distinct keys for which
+    the items are returned, from the biggest key down, every
+    tied item in the original order. For *k* > 1 keys must be
+    hashable; it takes O(n log k) time and O(k + ties) memory.
     >>> mad_max(range(9))
     [8]
     >>> mad_max([1,2,2,2,3,4,5,5])
@@ -93,62 +306,266 @@ def mad_max (iterable, default=(), key=lambda x:x):
     [('d', 2)]
     >>> mad_max(d, key=lambda x:x[1])
     [('c', 2), ('d', 2)]
+    >>> mad_max([1,2,2,2,3,4,5,5], k=3)
+    [5, 5, 4, 3]
+    >>> mad_max(d, key=lambda x:x[1], k=2)
+    [('c', 2), ('d', 2), ('a', 1), ('b', 1)]
     """
-    iterable = iter(iterable)
-    founds = []
-    try:
-        first = next(iterable)
-        max = key(first)
-        founds.append(first)
-    except StopIteration:
-        return default
-    for item in iterable:
-        this = key(item)
-        if this > max:
-            max = this
-            founds = [item]
-        elif max == this:
-            founds.append(item)
-    return founds
+    return _mad_top(iterable, default, key, k, True)
 
 
-def minmax (seq):
+def mad_min (iterable, default=(), key=lambda x:x, k=1):
+    """
+    Return the smallest ITEMS from *iterable*, see mad_max.
+    >>> mad_min([3,1,2,1,5])
+    [1, 1]
+    >>> mad_min([3,1,2,1,5], k=2)
+    [1, 1, 2]
+    >>> mad_min([])
+    ()
+    """
+    return _mad_top(iterable, default, key, k, False)
+
+
+def minmax (seq, key=None, default=_NODEFAULT, chunk=None):
     """
     Returns the min() and max() value of $seq.
-    Raise ValueError if $seq is empty.
+    $key, if given, is called once on every item and the items with
+    the smallest and the biggest key are returned (the first ones in
+    case of ties, just like min() and max() do).
+    If $seq is empty returns $default or, if not given, raise ValueError.
+    Numpy arrays (and array.array of numbers, if numpy is available)
+    are delegated to numpy when no $key is given, returning python
+    numbers (as the items of an array.array are). If $chunk is a
+    positive int, lists and tuples are scanned by the builtin min() and
+    max() on slices of $chunk items. Anything else is scanned in a single
+    pass comparing the items in pairs: about 3 comparisons every 2 items
+    instead of the 2 every item of the naive approach.
     >>> minmax(range(-10,10))
     (-10, 9)
     >>> minmax([1])
     (1, 1)
     >>> minmax('foobar')
     ('a', 'r')
+    >>> minmax(['aaa', 'b', 'cc', 'd'], key=len)
+    ('b', 'aaa')
+    >>> minmax(iter([]), default=(None, None))
+    (None, None)
+    >>> minmax(list(range(100)), chunk=7)
+    (0, 99)
     """
-    for i in seq:
-        imin = imax = i
+    if key is None and numpy is not None:
+        if isinstance(seq, array.array) and seq.typecode in _NUMERIC_TYPECODES:
+            arr = numpy.frombuffer(seq, dtype=seq.typecode)
+            if arr.size:
+                return (arr.min().item(), arr.max().item())
+            seq = ()
+        elif isinstance(seq, numpy.ndarray):
+            if seq.size:
+                return (seq.min().item(), seq.max().item())
+            seq = ()
+    if chunk is not None and isinstance(seq, (list, tuple)):
+        return _minmax_chunked(seq, key, default, chunk)
+    it = iter(seq)
+    for first in it:
         break
-    for i in seq:
-        if i < imin:
-            imin = i
-        elif i > imax:
-            imax = i
-    try:
+    else:
+        if default is _NODEFAULT:
+            raise ValueError('minmax(): empty sequence')
+        return default
+    imin = imax = first
+    if key is None:
+        # the last item of an odd sequence is paired with the first one,
+        # which is already the current min and max, so never replaces them.
+        for a, b in itertools.zip_longest(it, it, fillvalue=first):
+            if b < a:
+                if b < imin:
+                    imin = b
+                if imax < a:
+                    imax = a
+            else:
+                if a < imin:
+                    imin = a
+                if imax < b:
+                    imax = b if a < b else a
         return (imin, imax)
-    except UnboundLocalError:
-        raise ValueError('minmax(): empty sequence') from None
+    kmin = kmax = key(first)
+    # a missing last item is replaced by the previous one, not keyed again
+    for a, b in itertools.zip_longest(it, it, fillvalue=_NODEFAULT):
+        ka = key(a)
+        if b is _NODEFAULT:
+            b, kb = a, ka
+        else:
+            kb = key(b)
+        if kb < ka:
+            if kb < kmin:
+                imin, kmin = b, kb
+            if kmax < ka:
+                imax, kmax = a, ka
+        else:
+            if ka < kmin:
+                imin, kmin = a, ka
+            if kmax < kb:
+                if ka < kb:
+                    imax, kmax = b, kb
+                else:
+                    imax, kmax = a, ka
+    return (imin, imax)
+
+
+def _minmax_chunked (seq, key, default, chunk):
+    """minmax() using the builtin min() and max() on $chunk sized slices of $seq."""
+    if chunk < 1:
+        raise ValueError(f'minmax(): chunk must be positive, not {chunk}')
+    if not seq:
+        if default is _NODEFAULT:
+            raise ValueError('minmax(): empty sequence')
+        return default
+    if key is None:
+        imin = imax = seq[0]
+        for i in range(0, len(seq), chunk):
+            part = seq[i:i+chunk]
+            cmin, cmax = min(part), max(part)
+            if cmin < imin:
+                imin = cmin
+            if imax < cmax:
+                imax = cmax
+        return (imin, imax)
+    # every chunk is decorated once as (key, item) pairs,
+    # so $key is called exactly once on every item.
+    first = operator.itemgetter(0)
+    kmin = kmax = imin = imax = None
+    for i in range(0, len(seq), chunk):
+        items = seq[i:i+chunk]
+        part = list(zip(map(key, items), items))
+        (kcmin, cmin), (kcmax, cmax) = min(part, key=first), max(part, key=first)
+        if not i:
+            kmin, imin, kmax, imax = kcmin, cmin, kcmax, cmax
+            continue
+        if kcmin < kmin:
+            imin, kmin = cmin, kcmin
+        if kmax < kcmax:
+            imax, kmax = cmax, kcmax
+    return (imin, imax)
+
+
+class BloomFilter:
+    """
+    Probabilistic set of (hashable) items: after add(x), x in filter
+    is always true, but for items never added it can be true too, with
+    probability about $error_rate while at most $capacity items are added.
+    Uses $capacity * -log2($error_rate) / log(2) bits whatever the items
+    are, i.e. about 1.2 bytes per item for a 1% error rate.
+    """
+    __slots__ = ('size', 'nhashes', '_bits')
+    def __init__ (self, capacity: int, error_rate: float = 0.01):
+        if capacity < 1:
+            raise ValueError(f'BloomFilter: capacity must be positive, not {capacity}')
+        if not 0 < error_rate < 1:
+            raise ValueError(f'BloomFilter: error_rate must be in (0, 1), not {error_rate}')
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.nhashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+    def _hashes (self, item):
+        # double hashing: h1 + i*h2, with h2 odd
+        return hash((item, 1)) % self.size, (hash((item, 2)) | 1) % self.size
+    def __contains__ (self, item):
+        bits, size = self._bits, self.size
+        h, step = self._hashes(item)
+        for _ in range(self.nhashes):
+            if not bits[h >> 3] & (1 << (h & 7)):
+                return False
+            h = (h + step) % size
+        return True
+    def add (self, item):
+        """Adds $item, returns True if it (probably) was already there."""
+        bits, size = self._bits, self.size
+        h, step = self._hashes(item)
+        found = True
+        for _ in range(self.nhashes):
+            mask = 1 << (h & 7)
+            if not bits[h >> 3] & mask:
+                bits[h >> 3] |= mask
+                found = False
+            h = (h + step) % size
+        return found
 
 
-def remove_dup (seq):
-    """Removes duplicated items in $seq, keeping the original order."""
-    new = []
-    lst = list(seq) # for iterable $seq
-    s = set(lst)
-    for x in lst:
-        if not s:
-            break
-        if x in s:
-            new.append(x)
-            s.remove(x)
-    return new
+def iremove_dup (iterable, key=None, bloom=None, error_rate=0.01):
+    """
+    Yields the items of $iterable skipping the duplicated ones,
+    keeping the original order. If $key is given, items are
+    duplicated when key(item) are equal, and the first one is kept.
+    Keys are tracked in a set or, for unhashable ones (i.e. lists), in
+    a sorted list searched by bisection, using their repr() for the ones
+    which can't be ordered either (i.e. dicts, so equal dicts with keys
+    in different order are not seen as duplicated).
+    If $bloom (the expected number of distinct items) is given, keys are
+    tracked in a BloomFilter instead, with constant memory, but unique
+    items are skipped too with probability about $error_rate.
+    >>> list(iremove_dup([1, 2, 1, 3, 2]))
+    [1, 2, 3]
+    >>> list(iremove_dup(['a', 'B', 'b', 'A', 'c'], key=str.lower))
+    ['a', 'B', 'c']
+    >>> list(iremove_dup([[1], [2], [1], {1: 2}, {1: 2}]))
+    [[1], [2], {1: 2}]
+    """
+    if bloom is not None:
+        seen = BloomFilter(bloom, error_rate)
+        for item in iterable:
+            k = item if key is None else key(item)
+            try:
+                found = seen.add(k)
+            except TypeError:
+                found = seen.add(repr(k))
+            if not found:
+                yield item
+        return
+    seen = set()
+    ordered = []
+    reprs = set()
+    for item in iterable:
+        k = item if key is None else key(item)
+        try:
+            if k in seen:
+                continue
+            seen.add(k)
+        except TypeError:
+            if isinstance(k, set):
+                # sets are only partially ordered, use them as frozensets
+                k = frozenset(k)
+                if k in seen:
+                    continue
+                seen.add(k)
+            elif _seen_unhashable(k, ordered, reprs):
+                continue
+        yield item
+
+
+def _seen_unhashable (k, ordered, reprs):
+    """Checks for $k in the sorted list $ordered, or its repr in $reprs if $k
+    can't be ordered, adding it when missing. Returns True if found."""
+    try:
+        k < k  # raises TypeError for unorderable types
+        i = bisect.bisect_left(ordered, k)
+    except TypeError:
+        r = repr(k)
+        if r in reprs:
+            return True
+        reprs.add(r)
+        return False
+    if i < len(ordered) and ordered[i] == k:
+        return True
+    ordered.insert(i, k)
+    return False
+
+
+def remove_dup (seq, key=None):
+    """
+    Removes duplicated items in $seq, keeping the original order.
+    Returns a list, see iremove_dup for $key and unhashable items.
+    """
+    return list(iremove_dup(seq, key))
 
 
 def secs2time (secs: Number) -> (int, int, int, int):
@@ -172,8 +589,8 @@ def split_at (seq: Sequence, indexes: Sequence[int], where='after') -> Iterator[
     >>> list(split_at(range(7), [2,4,8,15]))
     [[0, 1, 2], [3, 4], [5, 6]]
     >>> # $indexes should be a sequence of *distinct* sorted integers
-    >>> #in range 0..n cuz negative indexes or repeated ones may lead
-    >>> to unexpected results (obviously).
+    >>> # in range 0..n cuz negative indexes or repeated ones may lead
+    >>> # to unexpected results (obviously).
     >>> list(split_at(range(9), [-1,2,4,6])) 
     [[0, 1, 2], [3, 4], [5, 6], [7, 8]]
     >>> list(split_at(range(9), [-1,-2,4,6]))
@@ -189,6 +606,71 @@ def split_at (seq: Sequence, indexes: Sequence[int], where='after') -> Iterator[
     >>> list(split_at(range(11), [7,4,3], where='at'))
     [[0, 1, 2, 3, 4, 5, 6], [7], [8], [9, 10]]
     """
+    points = _split_points(indexes, where)
+    if isinstance(seq, Sequence):
+        # slices of lists are already new lists
+        as_list = (lambda x: x) if isinstance(seq, list) else list
+        size = len(seq)
+        head = 0
+        for tail in points:
+            if tail >= size:
+                break
+            if tail > head:
+                yield as_list(seq[head:tail])
+                head = tail
+        if head < size:
+            yield as_list(seq[head:])
+    else:
+        it = iter(seq)
+        head = 0
+        for tail in points:
+            if tail > head:
+                chunk = list(itertools.islice(it, tail - head))
+                if not chunk:
+                    return
+                yield chunk
+                if len(chunk) < tail - head:
+                    return
+                head = tail
+        chunk = list(it)
+        if chunk:
+            yield chunk
+
+
+def _split_points (indexes, where):
+    """
+    Yields the positions where split_at starts a new piece (ascending,
+    maybe 0), computed from the $indexes only: the current index is
+    replaced by the next one at the first position past it ('after')
+    or at it ('at'), one index per position at most, and a new piece
+    starts whenever the replacing index differs from the replaced one.
+    """
+    if where == 'after':
+        offset = 1
+    elif where == 'at':
+        offset = 0
+    else:
+        raise ValueError(f'wrong value for "where": "{where}"')
+    indexes = iter(indexes)
+    for current in indexes:
+        break
+    else:
+        return
+    pos = -1
+    for index in itertools.chain(indexes, (None,)):
+        pos += 1
+        if current + offset > pos:
+            pos = current + offset
+        if index != current:
+            yield pos
+        if index is None:
+            return
+        current = index
+
+
+def split_at_groupby (seq: Sequence, indexes: Sequence[int], where='after') -> Iterator[List]:
+    """Like split_at, grouping the items of $seq by itertools.groupby
+    with a key function called on every item (the old implementation)."""
     if where == 'after':
         compare = operator.gt
     elif where == 'at':
@@ -246,11 +728,109 @@ def sub_split (s, min=2):
 ###################
 
 
+def _test_date_range ():
+    from random import choice, randint, sample
+    first = datetime.date(2000, 1, 1)
+    for _ in range(500):
+        start = first + datetime.timedelta(randint(0, 2000))
+        end = first + datetime.timedelta(randint(0, 2000))
+        step = choice((1, 1, 2, 3, 7, 10, -1, -3, -7))
+        include_end = choice((True, False))
+        weekdays = choice((None, sample(range(7), randint(0, 7))))
+        # naive way
+        expected = []
+        date = start
+        stop = end + datetime.timedelta(include_end if step > 0 else -include_end)
+        while (date < stop) if step > 0 else (date > stop):
+            if weekdays is None or date.weekday() in weekdays:
+                expected.append(date)
+            date += datetime.timedelta(step)
+        res = date_range(start, end, include_end=include_end, step=step, weekdays=weekdays)
+        assert res == expected, f'FAIL: date_range({start}, {end}, {include_end}, {step}, {weekdays})'
+        res = date_range(start, end, include_end=include_end, step=step, weekdays=weekdays, lazy=True)
+        assert list(res) == expected, 'FAIL: date_range (lazy)'
+        if numpy is not None:
+            res = date_range(start, end, include_end=include_end, step=step, weekdays=weekdays, as_array=True)
+            assert res.tolist() == expected, 'FAIL: date_range (as_array)'
+    odd = lambda d: d.day % 2
+    assert (date_range(first, '2000-03-01', odd)
+            == list(filter(odd, date_range(first, '2000-03-01')))), 'FAIL: date_range (filter)'
+    if numpy is not None:
+        res = date_range(first, '2000-03-01', lambda a: (a.astype('int64') % 2) == 0, as_array=True)
+        assert all(d.toordinal() % 2 == datetime.date(1970, 1, 1).toordinal() % 2
+                   for d in res.tolist()), 'FAIL: date_range (as_array, filter)'
+    return True
+
 def _test_frange ():
+    from decimal import Decimal
+    from fractions import Fraction
+    from random import randint
     args = ([10, 2, -2], [10, 2, 2], [10, 22, -2], [10, 22, 2])
     for arg in args:
         assert list(range(*arg)) == list(frange(*arg))
     assert list(frange(10, 12, 0.5)) == [10, 10.5, 11.0, 11.5]
+    for _ in range(500):
+        arg = [randint(-50, 50), randint(-50, 50), randint(1, 7) * (-1) ** randint(0, 1)]
+        r, fr = range(*arg), frange(*arg)
+        assert len(r) == len(fr), f'FAIL: frange: len {arg}'
+        assert list(r) == list(fr), f'FAIL: frange {arg}'
+        if r:
+            i = randint(-len(r), len(r) - 1)
+            assert r[i] == fr[i], f'FAIL: frange: index {arg} [{i}]'
+        sl = slice(randint(-60, 60), randint(-60, 60), randint(1, 4) * (-1) ** randint(0, 1))
+        assert list(r[sl]) == list(fr[sl]), f'FAIL: frange: slice {arg} [{sl}]'
+    # no accumulated error
+    r = frange(0, 1000, 0.1)
+    assert len(r) == 10000 and r[-1] == 0.1 * 9999, 'FAIL: frange: float error'
+    # exact
+    assert sum(frange(0, 1, Fraction(1, 10))) == Fraction(9, 2), 'FAIL: frange: Fraction'
+    assert list(frange(Decimal('0'), Decimal('0.5'), Decimal('0.1')))[-1] == Decimal('0.4'), 'FAIL: frange: Decimal'
+    for step in (1, 0.1, 0.7, -0.3):
+        for stop in (0, 0.3, 1, 10.5):
+            r = frange(-3.3, stop, step)
+            assert list(r) == [-3.3 + i * step for i in range(len(r))], f'FAIL: frange: {r}'
+            assert all(v < stop if step > 0 else v > stop for v in r), f'FAIL: frange: stop {r}'
+            assert not r or not (r.stop < stop if step > 0 else r.stop > stop), f'FAIL: frange: last {r}'
+            if numpy is not None:
+                assert frange(-3.3, stop, step, as_array=True).tolist() == list(r), 'FAIL: frange: as_array'
+    # not finite stop: lazy values
+    inf = float('inf')
+    r = list(itertools.islice(frange(1, inf, 0.5), 5))
+    assert r == [1, 1.5, 2.0, 2.5, 3.0], f'FAIL: frange: inf {r}'
+    r = list(itertools.islice(frange(Decimal(0), Decimal('-Infinity'), Decimal(-1)), 3))
+    assert r == [0, -1, -2], f'FAIL: frange: -Infinity {r}'
+    for stop, step in ((-inf, 1), (inf, -1), (float('nan'), 1)):
+        assert list(frange(0, stop, step)) == [], f'FAIL: frange: {stop} {step}'
+    # huge, but finite
+    r = frange(0, 10**400, 3)
+    assert r[-1] == 10**400 - 1 and r[10**399] == 3 * 10**399, 'FAIL: frange: big int'
+    assert r == frange(0, 10**400 + 2, 3) and r != frange(0, 10**400 + 3, 3), 'FAIL: frange: big int eq'
+    r = frange(Fraction(1, 3), Fraction(10**400, 7), Fraction(1, 7))
+    assert r[-1] < Fraction(10**400, 7) <= r[-1] + Fraction(1, 7), 'FAIL: frange: big Fraction'
+    r = frange(Decimal('0'), Decimal('1e400'), Decimal('1e399'))
+    assert len(r) == 10 and r[-1] == Decimal('9e399'), 'FAIL: frange: big Decimal'
+    for index in (1.5, 1.0, '1'):
+        try:
+            frange(0, 5)[index]
+        except TypeError:
+            pass
+        else:
+            raise AssertionError(f'FAIL: frange: index {index!r}: no error?')
+    try:
+        frange(0, inf, as_array=True)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('FAIL: frange: inf as_array: no error?')
+    # equality and hashing like range
+    for _ in range(500):
+        a1 = [randint(-5, 5), randint(-5, 5), randint(1, 3) * (-1) ** randint(0, 1)]
+        a2 = [randint(-5, 5), randint(-5, 5), randint(1, 3) * (-1) ** randint(0, 1)]
+        assert (frange(*a1) == frange(*a2)) == (range(*a1) == range(*a2)), f'FAIL: frange: eq {a1} {a2}'
+        if frange(*a1) == frange(*a2):
+            assert hash(frange(*a1)) == hash(frange(*a2)), f'FAIL: frange: hash {a1} {a2}'
+    assert frange(0, 1, 0.5) == frange(0.0, 0.9, 0.5) and frange(0, 1, 0.5) != frange(0, 1, 0.25), 'FAIL: frange: eq'
+    assert frange(0, 3) != range(0, 3) and len({frange(0, 3), frange(0, 3)}) == 1, 'FAIL: frange: eq/hash'
     return True
 
 def _test_minmax():
@@ -268,6 +848,45 @@ def _test_minmax():
         imin, imax = minmax(seq)
         smin, smax = min(seq), max(seq)
         assert imin == smin and imax == smax, f'FAIL: minmax:({imin},{imax}) != ({smin},{smax}) | seq: {seq}'
+        for chunk in (None, 1, 7, 1000):
+            assert minmax(seq, chunk=chunk) == (smin, smax), f'FAIL: minmax(chunk={chunk}) | seq: {seq}'
+            assert minmax(iter(seq), chunk=chunk) == (smin, smax), f'FAIL: minmax(iter, chunk={chunk}) | seq: {seq}'
+    # key: first min and first max on ties, like min() and max()
+    for seq in tocheck:
+        pairs = [(x % 7, i) for i, x in enumerate(seq)]
+        for size in (1, 2, 3, len(pairs)):
+            part = pairs[:size]
+            expected = (min(part, key=operator.itemgetter(0)), max(part, key=operator.itemgetter(0)))
+            for chunk in (None, 3):
+                res = minmax(part, key=operator.itemgetter(0), chunk=chunk)
+                assert res == expected, f'FAIL: minmax(key, chunk={chunk}): {res} != {expected}'
+    for empty in ([], (), iter([]), array.array('d')):
+        for chunk in (None, 4):
+            assert minmax(empty, default=None, chunk=chunk) is None, f'FAIL: minmax({empty}, default=None)'
+            try:
+                minmax(empty, chunk=chunk)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f'FAIL: minmax({empty}): no error?')
+    # key is called once on every item
+    calls = []
+    def counted_key (x):
+        calls.append(x)
+        return x
+    for size in (1, 2, 99, 100):
+        for chunk in (None, 7):
+            calls.clear()
+            minmax(list(range(size)), key=counted_key, chunk=chunk)
+            assert len(calls) == size, f'FAIL: minmax: {len(calls)} key calls for {size} items (chunk={chunk})'
+    arr = array.array('d', (randint(-1000,1000) / 3 for _ in range(1000)))
+    assert minmax(arr) == (min(arr), max(arr)), 'FAIL: minmax(array.array)'
+    if numpy is not None:
+        nparr = numpy.array(arr)
+        assert minmax(nparr) == (min(arr), max(arr)), 'FAIL: minmax(numpy.ndarray)'
+        for a in (arr, nparr, array.array('q', [3, 1, 2]), numpy.array([3, 1, 2])):
+            assert all(type(x) in (int, float) for x in minmax(a)), f'FAIL: minmax: types {minmax(a)}'
+        assert minmax(nparr[:0], default=0) == 0, 'FAIL: minmax(empty numpy.ndarray)'
     return True
 
 def _test_mad_max():
@@ -281,9 +900,31 @@ def _test_mad_max():
     assert len(lmax) == 2, f'FAIL: mad_max: wrong len!'
     assert len(set(lmax)) == 1, f'FAIL: mad_max: values differs!'
     assert lmax[0] == limit - 1, f'FAIL: mad_max: not really the max!'
+    # top-k, compared with sorting
+    from random import randint
+    for _ in range(200):
+        items = [(randint(0, 30), i) for i in range(randint(0, 100))]
+        keys = sorted(set(x for x, _ in items))
+        for k in (1, 2, 3, 10, 50):
+            best = keys[-k:]
+            expected = [item for key in reversed(best) for item in items if item[0] == key]
+            res = mad_max(items, key=operator.itemgetter(0), k=k)
+            assert res == (expected or ()), f'FAIL: mad_max(k={k}): {res} != {expected}'
+            best = keys[:k]
+            expected = [item for key in best for item in items if item[0] == key]
+            res = mad_min(iter(items), key=operator.itemgetter(0), k=k)
+            assert res == (expected or ()), f'FAIL: mad_min(k={k}): {res} != {expected}'
+    assert mad_max([], default=None, k=3) is None, 'FAIL: mad_max: default'
+    try:
+        mad_max([1], k=0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('FAIL: mad_max(k=0): no error?')
     return True
 
 def _test_remove_dup ():
+    from random import randint
     tocheck = [([1,2,3,4, 1],[1,2,3,4]),
              ([1,2,3,1,5,6,6,4],[1,2,3,5,6,4]),
              ([],[]),
@@ -292,6 +933,27 @@ def _test_remove_dup ():
     ]
     for initial, result in tocheck:
         assert remove_dup(initial) == result, f'FAIL: remove_dup: {initial} != {result}'
+        assert list(iremove_dup(iter(initial))) == result, f'FAIL: iremove_dup: {initial} != {result}'
+    # key and unhashables
+    words = ['foo', 'Bar', 'FOO', 'baz', 'bar', 'Baz']
+    assert remove_dup(words, key=str.lower) == ['foo', 'Bar', 'baz'], 'FAIL: remove_dup(key)'
+    mixed = [[1], {1}, [2, 3], {1: 'a'}, [1], {1}, {1: 'a'}, 'x', [2, 3], ['a'], ['a'], {1: 'b'}, 'x']
+    result = [[1], {1}, [2, 3], {1: 'a'}, 'x', ['a'], {1: 'b'}]
+    assert remove_dup(mixed) == result, f'FAIL: remove_dup (unhashables): {remove_dup(mixed)}'
+    lists = [[randint(0, 50)] for _ in range(1000)]
+    assert remove_dup(lists) == [list(t) for t in remove_dup(map(tuple, lists))], 'FAIL: remove_dup (lists)'
+    # streaming
+    gen = iremove_dup(itertools.cycle([1, 2, 3]))
+    assert list(itertools.islice(gen, 3)) == [1, 2, 3], 'FAIL: iremove_dup (infinite)'
+    # bloom filter: no false negatives, few false positives
+    items = [randint(0, 10**9) for _ in range(10000)]
+    unique = remove_dup(items)
+    approx = list(iremove_dup(items + items, bloom=len(items), error_rate=0.01))
+    assert set(approx) <= set(unique), 'FAIL: iremove_dup (bloom): duplicated items'
+    assert len(approx) >= len(unique) * 0.95, f'FAIL: iremove_dup (bloom): too many misses ({len(approx)}/{len(unique)})'
+    assert list(iremove_dup(mixed, bloom=100)) == result, 'FAIL: iremove_dup (bloom, unhashables)'
+    bf = BloomFilter(1000)
+    assert not bf.add('a') and bf.add('a') and 'a' in bf, 'FAIL: BloomFilter.add'
     return True
 
 def _test_split ():
@@ -323,6 +985,22 @@ def _test_split ():
     for lst, indexes, res in triplets:
         assert list(split_at(lst, indexes)) == res, f'[FAIL]: {lst} != {res}'
         assert list(split_at(lst, indexes, 'at')) == res, f'[FAIL]: {lst} != {res}'
+        assert list(split_at(iter(lst), indexes)) == res, f'[FAIL]: iter({lst}) != {res}'
+    # same results of the groupby version, even for unsorted,
+    # negative or repeated indexes, on sequences and iterators:
+    for _ in range(500):
+        llen = r(0, 50)
+        indexes = [r(-5, llen + 5) for _ in range(r(0, 10))]
+        if r(0, 1):
+            indexes.sort()
+        for where in ('after', 'at'):
+            res = list(split_at_groupby(range(llen), indexes, where))
+            for seq in (range(llen), list(range(llen)), iter(range(llen))):
+                out = list(split_at(seq, indexes, where))
+                assert out == res, f'[FAIL]({where}): {out} != {res} | {indexes}'
+    # lazy on infinite iterators (and indexes)
+    res = list(itertools.islice(split_at(itertools.count(), itertools.count(1, 2)), 3))
+    assert res == [[0, 1], [2, 3], [4, 5]], f'[FAIL]: (infinite) {res}'
     return True
 
 def _test_split_cmp ():
@@ -335,17 +1013,19 @@ def _test_split_cmp ():
     * (and so producing empty list) a real split.
     >>> list(split_at(range(10), [10], where='at'))
     [[0, 1, 2, 3, 4, 5, 6, 7, 8, 9]]
-    >>> list(np.array_split(range(10), [10]))
+    >>> list(numpy.array_split(range(10), [10]))
     [array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9]), array([], dtype=int64)]
+
     * Anothers thing worthy of reasoning is the case of unsorted indexes:
     >>> list(split_at(range(10), [7,4,3], where='at'))
     [[0, 1, 2, 3, 4, 5, 6], [7], [8], [9]]
-    >>> list(np.array_split(range(10), [7,4,3]))
+    >>> list(numpy.array_split(range(10), [7,4,3]))
     [array([0, 1, 2, 3, 4, 5, 6]), array([], dtype=int64), array([], dtype=int64), array([3, 4, 5, 6, 7, 8, 9])]
+
     * and also that of repeated indexes:
     >>> list(split_at(range(10), [3,5,5], where='at'))
     [[0, 1, 2], [3, 4, 5], [6, 7, 8, 9]]
-    >>> list(np.array_split(range(10), [3,5,5]))
+    >>> list(numpy.array_split(range(10), [3,5,5]))
     [array([0, 1, 2]), array([3, 4]), array([], dtype=int64), array([5, 6, 7, 8, 9])]
     """
     from random import randint as r
@@ -373,32 +1053,33 @@ indexes: {indexes}'''
 indexes: {indexes}'''
     return True
 
-def _split_time ():
+def _split_time (sizes=(10**5, 10**6, 10**7)):
     import timeit
-    from random import randint as r 
-    from numpy import array_split
+    from random import randint as r
     print('* Times:')
-    llen = r(10, 1000000)
-    lst = list(range(llen))
-    indexes = sorted(set(r(0, llen) for _ in range(r(0,llen))))
-    setup = 'from __main__ import split_at, split_at_with_axe'
-    stmt = '{}(lst, indexes)'
-    rep = 50
+    funcs = [('split_at', 'list(split_at(lst, indexes, where="at"))'),
+             ('split_at (iter)', 'list(split_at(iter(lst), indexes, where="at"))'),
+             ('split_at_groupby', 'list(split_at_groupby(lst, indexes, where="at"))'),
+             ('split_at_with_axe', 'split_at_with_axe(lst, indexes)')]
+    if numpy is not None:
+        funcs.append(('array_split', 'numpy.array_split(lst, indexes)'))
     report = '{:<20}: {:.4f}s'
-    loc = locals()
-    print(f'(list len = {llen} | indexes = {len(indexes)} | repeats = {rep})')
-    time = timeit.Timer('list(split_at(lst, indexes, where="at"))', setup, globals=loc).timeit(rep) / rep
-    print(report.format('split_at', time))
-    time = timeit.Timer(stmt.format('split_at_with_axe'), setup, globals=loc).timeit(rep) / rep
-    print(report.format('split_at_with_axe', time))
-    time = timeit.Timer(stmt.format('array_split'), setup, globals=loc).timeit(rep) / rep
-    print(report.format('array_split', time))
+    for llen in sizes:
+        lst = list(range(llen))
+        indexes = sorted(set(r(0, llen) for _ in range(r(0, llen // 2))))
+        rep = max(1, 10**6 // llen)
+        print(f'(list len = {llen} | indexes = {len(indexes)} | repeats = {rep})')
+        loc = dict(globals(), lst=lst, indexes=indexes)
+        for name, stmt in funcs:
+            time = timeit.Timer(stmt, globals=loc).timeit(rep) / rep
+            print(report.format(name, time))
 
 def _test ():
     print('* Run tests:')
+    _test_date_range() and print('  Test date_range: OK')
     _test_frange() and print('  Test frange: OK')
     _test_minmax() and print('  Test minmax: OK')
-    _test_mad_max() and print('  Test mad_max: OK')
+    _test_mad_max() and print('  Test mad_max/mad_min: OK')
     _test_remove_dup() and print('  Test remove_dup: OK')
     _test_split() and print('  Test splitting: OK')
     _test_split_cmp() and print('  Test splitting (compare): OK')
@@ -25,53 +25,112 @@
 # ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-from collections.abc import Callable, Sequence
+from collections import namedtuple
+from collections.abc import AsyncIterable, Callable, Sequence
+import inspect
+import io
+import itertools
+import mmap
 import operator
+import re
+import time
 
 class SizedQueue:
-    """A simple FIFO queue storing at most *max* items."""
+    """A simple FIFO queue storing at most *max* items.
+    A ring buffer: a preallocated list (doubled when full, if *max*
+    is unbounded) and the index of the oldest item, so push and pop
+    are O(1) and pushing on a full queue overwrites the oldest item."""
+    __slots__ = ('_max', '_items', '_head', '_count')
     def __init__ (self, max=float('+inf')):
+        if max < 0:
+            raise ValueError("max must be >= 0")
         self._max = max
-        self._items = []
+        self._items = [None] * (8 if max == float('+inf') else int(max))
+        self._head = 0
         self._count = 0
+    def __len__ (self):
+        return self._count
 
     def push (self, item):
-        self._items.append(item)
-        if self._count == self._max:
-            self._items.pop(0)
-        else:
+        items = self._items
+        size = len(items)
+        if self._count < size:
+            idx = self._head + self._count
+            items[idx - size if idx >= size else idx] = item
+            self._count += 1
+        elif size < self._max:
+            self._items = items[self._head:] + items[:self._head] + [None] * size
+            self._items[size] = item
+            self._head = 0
             self._count += 1
+        elif size:
+            items[self._head] = item
+            head = self._head + 1
+            self._head = 0 if head == size else head
     def pop(self):
-        if self._count > 0:
-            self._count -= 1
-        return self._items.pop()
+        """Removes and returns the last pushed item."""
+        if not self._count:
+            raise IndexError('pop from an empty SizedQueue')
+        self._count -= 1
+        idx = (self._head + self._count) % len(self._items)
+        item = self._items[idx]
+        self._items[idx] = None
+        return item
     def items(self):
-        for item in self._items:
-            yield item
+        """Yields the items, from the oldest."""
+        items = self._items
+        end = self._head + self._count
+        if end <= len(items):
+            yield from items[self._head:end]
+        else:
+            yield from items[self._head:]
+            yield from items[:end - len(items)]
     def empty(self):
-        self._items = []
+        """Removes all the items, releasing them."""
+        self._items[:] = [None] * len(self._items)
+        self._head = 0
         self._count = 0
-# XXX+TODO: compare SizedQueue with collection.deque
+
+Rule = namedtuple('Rule', ('name', 'match', 'pre', 'post'))
+Tagged = namedtuple('Tagged', ('tags', 'item'))
 
 class ContextIter:
     """
     Filters a given sequence using a callable for matching elements,
     keeping an amount of pre/post context.
+    Use $rules, a sequence of (name, match, pre, post) Rule, for
+    matching with different callables (or compiled regex) and
+    context sizes in a single pass (see gettagged); getctx, getctxcall
+    and the bytes mode then use the first rule, in place of $match,
+    $ctx_pre and $ctx_post.
     """
-    def __init__ (self, seq: Sequence = [], match: Callable = operator.truth, ctx_pre=0, ctx_post=0):
+    def __init__ (self, seq: Sequence = [], match: Callable = operator.truth, ctx_pre=0, ctx_post=0,
+                  rules: Sequence = (), first_match=True):
         if ctx_pre < 0 or ctx_post < 0:
             raise ValueError("ctx_pre and ctx_post must be >= 0")
+        if rules:
+            rules = [Rule(*rule) for rule in rules]
+        else:
+            rules = [Rule(getattr(match, '__name__', match), match, ctx_pre, ctx_post)]
+        if any(rule.pre < 0 or rule.post < 0 for rule in rules):
+            raise ValueError("rules pre and post must be >= 0")
+        self._rules = [rule._replace(match=rule.match.search)
+                       if isinstance(rule.match, re.Pattern) else rule
+                       for rule in rules]
+        self._first_match = first_match
         self._seq = seq
-        self._match = match
-        self._qpre = SizedQueue(ctx_pre)
-        self._ctx_pre = ctx_pre
-        self._ctx_post = ctx_post
+        _, self._match, self._ctx_pre, self._ctx_post = rules[0]
+        self._qpre = SizedQueue(self._ctx_pre)
+        self._buf = None
+        self._mmapped = False
     def __str__ (self):
-        return 'ContexIter({},{},{})'.format(self._match.__name__,self._ctx_pre,self._ctx_post)
+        return 'ContexIter({},{},{})'.format(
+            getattr(self._match, '__name__', self._match),self._ctx_pre,self._ctx_post)
     def getctx (self):
+        match = self._rules[0].match
         post_ctx = 0
         for i in self._seq:
-            if self._match(i):
+            if match(i):
                 for p in self._qpre.items():
                     yield p
                 yield i
@@ -83,9 +142,10 @@ class ContextIter:
             else:
                 self._qpre.push(i)
     def getctxcall (self):
+        match = self._rules[0].match
         post_ctx = 0
         for i in self._seq:
-            if self._match(i):
+            if match(i):
                 for p in self._qpre.items():
                     yield p
                 yield i
@@ -96,7 +156,349 @@ class ContextIter:
                 post_ctx -= 1
             else:
                 self._qpre.push(i)
+    def gettagged (self):
+        """
+        Like getctx, matching the items with all the rules in one pass,
+        yields Tagged(tags, item) where $tags is the tuple of the names
+        of the rules matching $item (empty for context items).
+        If $first_match is true the rules are tried in order, only
+        until the first matching one. Matching items get the largest
+        pre and post context of their rules, a post context
+        isn't shortened by the following matches and, as in getctx,
+        the pre context never goes back to items already yielded.
+        """
+        rules = self._rules
+        qpre = SizedQueue(max(rule.pre for rule in rules))
+        post_ctx = 0
+        for i in self._seq:
+            if self._first_match:
+                matched = next(((rule,) for rule in rules if rule.match(i)), ())
+            else:
+                matched = tuple(rule for rule in rules if rule.match(i))
+            if matched:
+                pre = max(rule.pre for rule in matched)
+                for p in itertools.islice(qpre.items(), max(0, len(qpre) - pre), None):
+                    yield Tagged((), p)
+                yield Tagged(tuple(rule.name for rule in matched), i)
+                qpre.empty()
+                post_ctx = max(post_ctx, max(rule.post for rule in matched))
+            elif post_ctx:
+                yield Tagged((), i)
+                post_ctx -= 1
+            else:
+                qpre.push(i)
 
+    # bytes mode
+    def __enter__ (self):
+        return self
+    def __exit__ (self, *exc_info):
+        self.close()
+    def close (self):
+        """Releases the buffer used by getwindows/getblocks, closing the
+        mmap made for a binary file (the file itself is left open)."""
+        if self._mmapped:
+            self._buf.close()
+            self._mmapped = False
+        self._buf = None
+    def _buffer (self):
+        """Returns $seq as a buffer supporting find/rfind: bytes, bytearray
+        and mmap as they are, binary files mmapped (or read, if they can't be)."""
+        if self._buf is None:
+            seq = self._seq
+            if isinstance(seq, (bytes, bytearray, mmap.mmap)):
+                self._buf = seq
+            elif hasattr(seq, 'read'):
+                if isinstance(seq, io.TextIOBase):
+                    raise TypeError('getwindows/getblocks need a binary file')
+                try:
+                    self._buf = mmap.mmap(seq.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._mmapped = True
+                except (OSError, ValueError, io.UnsupportedOperation):
+                    buf = seq.read() # pipes, empty files, in-memory streams
+                    if not isinstance(buf, (bytes, bytearray)):
+                        raise TypeError('getwindows/getblocks need a binary file')
+                    self._buf = buf
+            else:
+                self._buf = bytes(seq)
+        return self._buf
+    def _line_windows (self, buf):
+        """Yields the (start, end) offsets of the context of every line
+        (without the newline) matched by the $match callable."""
+        size = len(buf)
+        starts = SizedQueue(self._ctx_pre)
+        pos = 0
+        while pos < size:
+            nl = buf.find(b'\n', pos)
+            end = size if nl < 0 else nl + 1
+            if self._match(buf[pos:end if nl < 0 else nl]):
+                yield next(starts.items(), pos), _lines_after(buf, end, self._ctx_post)
+                starts.empty()
+            else:
+                starts.push(pos)
+            pos = end
+    def _regex_windows (self, buf):
+        """Yields the (start, end) offsets of the context of every line
+        matched by the $match compiled regex, searched on the whole buffer."""
+        size = len(buf)
+        pos = 0
+        while pos < size:
+            m = self._match.search(buf, pos)
+            if m is None:
+                return
+            start = buf.rfind(b'\n', 0, m.start()) + 1
+            nl = buf.find(b'\n', max(m.end() - 1, m.start()))
+            end = size if nl < 0 else nl + 1
+            for _ in range(self._ctx_pre):
+                if not start:
+                    break
+                start = buf.rfind(b'\n', 0, start - 1) + 1
+            yield start, _lines_after(buf, end, self._ctx_post)
+            pos = end
+    def getwindows (self):
+        """
+        For a bytes-like $seq (bytes, bytearray, mmap or a binary file,
+        which is mmapped) yields the (start, end) offsets of the context
+        windows of the lines (separated by b'\\n') matched by $match,
+        a bytes predicate or a compiled regex (faster, searched on the
+        whole buffer, a match selects the lines it spans).
+        Windows overlapping or adjacent are merged, so the lines
+        are the same getctx returns for the list of lines.
+        Use close() (or a with statement) to release the mmap of a file.
+        """
+        buf = self._buffer()
+        if isinstance(self._match, re.Pattern):
+            windows = self._regex_windows(buf)
+        else:
+            windows = self._line_windows(buf)
+        cur_start = cur_end = None
+        for start, end in windows:
+            if cur_end is not None and start <= cur_end:
+                cur_end = max(cur_end, end)
+                continue
+            if cur_end is not None:
+                yield cur_start, cur_end
+            cur_start, cur_end = start, end
+        if cur_end is not None:
+            yield cur_start, cur_end
+    def getblocks (self):
+        """Like getwindows, but yields zero-copy memoryviews
+        of the windows (to be released before closing the buffer)."""
+        view = memoryview(self._buffer())
+        try:
+            for start, end in self.getwindows():
+                yield view[start:end]
+        finally:
+            view.release()
+
+class AsyncContextIter:
+    """
+    Like ContextIter.getctx, for an asynchronous iterable (i.e. the lines
+    of an asyncio stream), yielding the items as they arrive, so many
+    streams can be filtered concurrently by the same event loop.
+    $match can be a coroutine function. If $flush (seconds) is given,
+    pending pre context items older than $flush seconds (by $clock) when
+    an item matches are discarded, as unrelated to the match.
+    """
+    def __init__ (self, seq: AsyncIterable, match: Callable = operator.truth, ctx_pre=0, ctx_post=0,
+                  flush=None, clock: Callable = time.monotonic):
+        if ctx_pre < 0 or ctx_post < 0:
+            raise ValueError("ctx_pre and ctx_post must be >= 0")
+        self._seq = seq
+        self._match = match
+        self._ctx_pre = ctx_pre
+        self._ctx_post = ctx_post
+        self._flush = flush
+        self._clock = clock
+    def __str__ (self):
+        return 'AsyncContexIter({},{},{})'.format(
+            getattr(self._match, '__name__', self._match),self._ctx_pre,self._ctx_post)
+    def __aiter__ (self):
+        return self.getctx()
+    async def getctx (self):
+        qpre = SizedQueue(self._ctx_pre)
+        post_ctx = 0
+        async for i in self._seq:
+            now = self._clock()
+            matched = self._match(i)
+            if inspect.isawaitable(matched):
+                matched = await matched
+            if matched:
+                for t, p in qpre.items():
+                    if self._flush is None or now - t <= self._flush:
+                        yield p
+                yield i
+                qpre.empty()
+                post_ctx = self._ctx_post
+            elif post_ctx:
+                yield i
+                post_ctx -= 1
+            else:
+                qpre.push((now, i))
+
+def _lines_after (buf, pos, n):
+    """Returns the offset of the end of the $n lines
+    starting at $pos in $buf (or the end of $buf)."""
+    size = len(buf)
+    for _ in range(n):
+        if pos >= size:
+            break
+        nl = buf.find(b'\n', pos)
+        pos = size if nl < 0 else nl + 1
+    return pos
+
+
+def _test():
+    from collections import deque
+    import random
+    for max in (0, 1, 2, 7, 100, float('+inf')):
+        q = SizedQueue(max)
+        d = deque(maxlen=None if max == float('+inf') else max)
+        for _ in range(1000):
+            op = random.random()
+            if op < 0.6:
+                item = random.random()
+                q.push(item)
+                d.append(item)
+            elif op < 0.8 and d:
+                assert q.pop() == d.pop(), '[FAIL] SizedQueue.pop'
+            elif op < 0.82:
+                q.empty()
+                d.clear()
+            assert list(q.items()) == list(d), f'[FAIL] SizedQueue.items (max={max})'
+            assert len(q) == len(d), f'[FAIL] SizedQueue.__len__ (max={max})'
+    try:
+        SizedQueue(3).pop()
+        assert False, '[FAIL] SizedQueue.pop (empty)'
+    except IndexError:
+        pass
+    import weakref
+    class Item:
+        pass
+    for max in (3, float('+inf')):
+        q = SizedQueue(max)
+        items = [Item() for _ in range(5)]
+        refs = [weakref.ref(item) for item in items]
+        for item in items:
+            q.push(item)
+        del items, item
+        q.empty()
+        assert all(ref() is None for ref in refs), f'[FAIL] SizedQueue.empty: items still alive (max={max})'
+    print('SizedQueue: OK')
+    import tempfile
+    words = (b'foo', b'bar', b'baz', b'ERROR', b'')
+    for _ in range(200):
+        lines = [b' '.join(random.choices(words, k=random.randint(0, 3)))
+                 for _ in range(random.randint(0, 60))]
+        data = b''.join(line + b'\n' for line in lines)
+        if lines and lines[-1] and random.random() < 0.5:
+            data = data[:-1] # last line without newline
+        pre, post = random.randint(0, 4), random.randint(0, 4)
+        expected = list(ContextIter(lines, lambda line: b'ERROR' in line, pre, post).getctx())
+        for match in (lambda line: b'ERROR' in line, re.compile(b'ERROR')):
+            for seq in (data, bytearray(data)):
+                c = ContextIter(seq, match, pre, post)
+                windows = list(c.getwindows())
+                r = [line for start, end in windows for line in seq[start:end].splitlines()]
+                assert r == expected, f'[FAIL] getwindows {r} != {expected}'
+                assert all(e1 < s2 for (_, e1), (s2, _) in zip(windows, windows[1:])), '[FAIL] getwindows: not merged'
+                assert [bytes(b) for b in c.getblocks()] == [seq[s:e] for s, e in windows], '[FAIL] getblocks'
+            with tempfile.TemporaryFile() as f:
+                f.write(data)
+                f.flush()
+                f.seek(0)
+                with ContextIter(f, match, pre, post) as c:
+                    r = [line for block in c.getblocks() for line in bytes(block).splitlines()]
+                    assert r == expected, '[FAIL] getblocks (file)'
+                    buf = c._buffer()
+                assert not c._mmapped and (not isinstance(buf, mmap.mmap) or buf.closed), '[FAIL] close (mmap)'
+    with tempfile.TemporaryFile('w+') as f:
+        f.write('foo\nERROR\n')
+        f.seek(0)
+        for text in (f, io.StringIO('foo\nERROR\n')):
+            try:
+                list(ContextIter(text, re.compile(b'ERROR')).getwindows())
+            except TypeError:
+                pass
+            else:
+                raise AssertionError('[FAIL] getwindows (text file): no error?')
+    print('ContextIter (bytes): OK')
+    for _ in range(200):
+        lst = [random.choice('abcx') for _ in range(random.randint(0, 60))]
+        pre, post = random.randint(0, 4), random.randint(0, 4)
+        c = ContextIter(lst, lambda i: i == 'x', pre, post)
+        assert [t.item for t in c.gettagged()] == list(c.getctx()), '[FAIL] gettagged (one rule)'
+        rules = [('x', lambda i: i == 'x', pre, post), ('x2', re.compile('x|a'), post, pre)]
+        r = list(ContextIter(lst, rules=rules, first_match=False).gettagged())
+        assert all(t.tags == (('x', 'x2') if t.item == 'x' else ('x2',) if t.item == 'a' else ())
+                   for t in r), '[FAIL] gettagged (tags)'
+        r = list(ContextIter(lst, rules=rules).gettagged())
+        assert all(t.tags == (('x',) if t.item == 'x' else ('x2',) if t.item == 'a' else ())
+                   for t in r), '[FAIL] gettagged (first match)'
+        # getctx uses the first rule
+        r = [t.item for t in ContextIter(lst, rules=rules[1:]).gettagged()]
+        assert list(ContextIter(lst, rules=rules[::-1]).getctx()) == r, '[FAIL] getctx (rules)'
+        assert list(ContextIter(lst, rules=rules[::-1]).getctxcall()) == r, '[FAIL] getctxcall (rules)'
+    lst = list(range(10)) + ['oom'] + list(range(10)) + ['warn'] + list(range(10))
+    rules = [('oom', lambda i: i == 'oom', 5, 0), ('warn', lambda i: i == 'warn', 0, 2)]
+    r = list(ContextIter(lst, rules=rules).gettagged())
+    assert r == ([Tagged((), i) for i in range(5, 10)] + [Tagged(('oom',), 'oom'), Tagged(('warn',), 'warn')]
+                 + [Tagged((), i) for i in range(2)]), f'[FAIL] gettagged (rules context): {r}'
+    print('ContextIter (rules): OK')
+    import asyncio
+    async def produce (lst, delay=0):
+        for i in lst:
+            await asyncio.sleep(delay)
+            yield i
+    async def collect (aiter):
+        return [i async for i in aiter]
+    async def is_x (i):
+        return i == 'x'
+    async def run_many (lsts, pre, post):
+        return await asyncio.gather(*(collect(AsyncContextIter(produce(lst), is_x, pre, post))
+                                      for lst in lsts))
+    lsts = [[random.choice('abcx') for _ in range(random.randint(0, 60))] for _ in range(100)]
+    pre, post = random.randint(0, 4), random.randint(0, 4)
+    results = asyncio.run(run_many(lsts, pre, post))
+    for lst, r in zip(lsts, results):
+        assert r == list(ContextIter(lst, lambda i: i == 'x', pre, post).getctx()), '[FAIL] AsyncContextIter'
+    now = 0
+    def clock ():
+        return now
+    async def produce_timed (items):
+        nonlocal now
+        for t, i in items:
+            now = t
+            yield i
+    items = [(0, 'a'), (1, 'b'), (5, 'c'), (6, 'x'), (7, 'd')]
+    c = AsyncContextIter(produce_timed(items), lambda i: i == 'x', 3, 1, flush=2, clock=clock)
+    assert asyncio.run(collect(c)) == ['c', 'x', 'd'], '[FAIL] AsyncContextIter (flush)'
+    print('AsyncContextIter: OK')
+
+def _bench(sizes=(1, 10, 100, 1000, 10000), pushes=100000, every=1000):
+    """Times $pushes push of SizedQueue and deque(maxlen=...) for
+    every context size in $sizes (so mostly on full queues), reading
+    all the items every $every push (like ContextIter does on matches)."""
+    from collections import deque
+    import timeit
+    def run_queue (size):
+        q = SizedQueue(size)
+        for i in range(pushes):
+            q.push(i)
+            if not i % every:
+                for _ in q.items():
+                    pass
+    def run_deque (size):
+        d = deque(maxlen=size)
+        for i in range(pushes):
+            d.append(i)
+            if not i % every:
+                for _ in d:
+                    pass
+    print('{:>8} {:>12} {:>12}'.format('size', 'SizedQueue', 'deque'))
+    for size in sizes:
+        tq = min(timeit.repeat(lambda: run_queue(size), number=1, repeat=3))
+        td = min(timeit.repeat(lambda: run_deque(size), number=1, repeat=3))
+        print('{:>8} {:>11.4f}s {:>11.4f}s'.format(size, tq, td))
 
 def _example():
     lst = [0,1,False,True]
@@ -180,4 +582,26 @@ y ContexIter(<lambda>,0,0) ['x', 1, 2, 'x', 3, 'x', 4]
 '''
 
 if __name__ == '__main__':
-    _example()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--test', dest='test', action='store_true', help='run tests')
+    parser.add_argument('-b', '--bench', dest='bench', action='store_true',
+                        help='benchmark SizedQueue vs collections.deque')
+    args = parser.parse_args()
+    if args.test:
+        _test()
+    if args.bench:
+        _bench()
+    if not (args.test or args.bench):
+        _example()
+
+
+"""
+$ python3 sizedcontext.py -b
+    size   SizedQueue        deque
+       1      0.0126s      0.0047s
+      10      0.0133s      0.0046s
+     100      0.0138s      0.0046s
+    1000      0.0167s      0.0052s
+   10000      0.0377s      0.0099s
+"""
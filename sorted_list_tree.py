@@ -11,9 +11,17 @@ Implementation of some sorted collections.
 """
 
 
+import array
+import bisect
 from collections import deque
 import heapq
+import itertools
+import json
+import math
+import mmap
 import operator
+import os
+import sys
 
 
 ########
@@ -24,16 +32,67 @@ class NodeError(Exception):
     pass
 
 
+def sorted_runs (seq):
+    """
+    Returns the list of the sorted runs of $seq.
+    Non descending runs are kept as they are, strictly
+    descending runs are reversed (like Timsort does).
+    >>> sorted_runs([1,2,2,5,4,3,0,7,8])
+    [[1, 2, 2, 5], [0, 3, 4], [7, 8]]
+    """
+    runs = []
+    it = iter(seq)
+    for first in it:
+        break
+    else:
+        return runs
+    run = [first]
+    descending = False
+    for item in it:
+        last = run[-1]
+        if len(run) == 1:
+            descending = item < last
+            run.append(item)
+        elif descending:
+            if item < last:
+                run.append(item)
+            else:
+                run.reverse()
+                runs.append(run)
+                run = [item]
+        elif item >= last:
+            run.append(item)
+        else:
+            runs.append(run)
+            run = [item]
+    if descending:
+        run.reverse()
+    runs.append(run)
+    return runs
+
+
+def merge_runs (runs):
+    """Returns a sorted list merging the sorted sequences in $runs,
+    in O(n log r) for r runs (O(n) when there's only one)."""
+    if not runs:
+        return []
+    elif len(runs) == 1:
+        return list(runs[0])
+    return list(heapq.merge(*runs))
+
+
 ################
 # NODE OBJECTS #
 ################
 
 class Node:
-    """Base Node Object."""
+    """Base Node Object, a leaf: subclasses define how
+    children are kept (the childs property, add_child
+    and remove_child)."""
+    __slots__ = ('_value', '_parent')
     def __init__(self, value=None, parent=None):
         self._value = value
         self._parent = parent
-        self._childs = []
     def __lt__ (self, value):
         return operator.lt(self.value, value)
     def __le__ (self, value):
@@ -51,13 +110,10 @@ class Node:
     def __repr__ (self):
         return f'{self.__class__.__name__}({self.value})'
     def add_child (self, node):
-        self._childs.append(node)
+        raise TypeError('leaf node')
     @property
     def childs (self):
-        return tuple(self._childs)
-    @childs.setter
-    def childs (self, seq):
-        self._childs = list(seq)
+        return ()
     def is_leaf (self):
         return not self.childs
     def is_root (self):
@@ -69,7 +125,7 @@ class Node:
     def parent (self, node):
         self._parent = node
     def remove_child (self, node):
-        self._childs.remove(node)
+        raise TypeError('leaf node')
     @property
     def value (self):
         return self._value
@@ -78,17 +134,43 @@ class Node:
         self._value = value
 
 
+class TreeNode(Node):
+    """A Node object with any number of children, kept in a list."""
+    __slots__ = ('_childs',)
+    def __init__(self, value=None, parent=None):
+        super().__init__(value, parent)
+        self._childs = []
+    def add_child (self, node):
+        self._childs.append(node)
+    @property
+    def childs (self):
+        return tuple(self._childs)
+    @childs.setter
+    def childs (self, seq):
+        self._childs = list(seq)
+    def remove_child (self, node):
+        self._childs.remove(node)
+
+
 class ListNode(Node):
-    """A Node object for linked lists."""
+    """A Node object for linked lists.
+    The next node is kept in its own slot (no childs list)."""
+    __slots__ = ('_next',)
     def __init__(self, value=None, parent=None):
         super().__init__(value, parent)
-        self.childs = [None]
+        self._next = None
+    @property
+    def childs (self):
+        return (self._next,)
+    @childs.setter
+    def childs (self, seq):
+        self._next, = seq
     @property
     def next (self):
-        return self._childs[0]
+        return self._next
     @next.setter
     def next (self, node):
-        self._childs[0] = node
+        self._next = node
     @property
     def prev (self):
         return self._parent
@@ -103,30 +185,60 @@ class ListNode(Node):
 
 class BinaryNode (Node):
     """A Node object with only two children.
-    By convention, the left child is lesser than the right child."""
+    By convention, the left child is lesser than the right child.
+    Children are kept in the left/right slots (no childs list),
+    missing ones are None."""
+    __slots__ = ('_left', '_right')
     def __init__ (self, value, parent=None):
         super().__init__(value, parent)
+        self._left = self._right = None
+    @property
+    def childs (self):
+        return tuple(n for n in (self._left, self._right) if n is not None)
+    @childs.setter
+    def childs (self, seq):
+        seq = tuple(seq)
+        if len(seq) > 2:
+            raise NodeError('BinaryNode cannot have more than two childs')
+        self._left, self._right = seq + (None,) * (2 - len(seq))
     def add_child (self, node):
-        if len(self.childs) == 2:
+        if self._right is not None:
             raise NodeError('BinaryNode already has two childs')
         node.parent = self
-        if len(self.childs) == 1:
-            if self.childs[0] > node:
-                self._childs.insert(0, node)
-            else:
-                super().add_child(node)
+        if self._left is None:
+            self._left = node
+        elif self._left > node:
+            self._left, self._right = node, self._left
+        else:
+            self._right = node
+    def remove_child (self, node):
+        if self._left is node:
+            self._left, self._right = self._right, None
+        elif self._right is node:
+            self._right = None
+        else:
+            raise ValueError('BinaryNode.remove_child(x): x not in childs')
     @property
     def left (self):
-        return self.childs[0]
+        return self._left
     @left.setter
     def left (self, node):
-        self._childs[0] = node
+        self._left = node
     @property
     def right (self):
-        return self.childs[1]
+        return self._right
     @right.setter
     def right (self, node):
-        self._childs[1] = node
+        self._right = node
+
+
+class SizedBinaryNode (BinaryNode):
+    """A BinaryNode which also keeps the number of
+    (non empty) nodes of the subtree rooted at itself."""
+    __slots__ = ('size',)
+    def __init__ (self, value, parent=None):
+        super().__init__(value, parent)
+        self.size = 0 if value is None else 1
 
 
 ###############
@@ -134,55 +246,134 @@ class BinaryNode (Node):
 ###############
 
 class SortedTree:
-    """Unbalanced sorted tree."""
+    """Sorted tree, kept balanced as a scapegoat tree: when add() puts
+    a node deeper than log(n, 1/_ALPHA), the subtree of its nearest
+    ancestor with a child bigger than _ALPHA times itself is rebuilt
+    balanced. So the height is O(log n) and add() takes amortized O(log n).
+    Nodes keeps the size of their subtree, for the
+    order statistics methods (select, rank, irange)."""
+    # empty leaf shared by all the nodes of all the trees,
+    # its parent is never set (see _insert_left/_insert_right).
+    _EMPTY = SizedBinaryNode(None)
+    _ALPHA = 2 / 3
     def __init__ (self, seq=None):
+        self._set_root(None)
         if seq:
-            it = iter(seq)
-            v = next(it)
-            self._set_root(v)
-            self.extend(it)
-        else:
-            self._set_root(None)
+            self.extend_sorted(seq)
     def __repr__ (self):
         return 'SortedTree(root={})'.format(self._root)
+    def __len__ (self):
+        return self._root.size
 
     def _add_node (self, newnode):
         if not self._root:
             self._set_root(newnode)
             return
         node = self._root
-        while node:
-            if newnode == node:
-                self._insert_left(node, newnode)
-                break
-            elif newnode < node:
+        path = []
+        while True:
+            node.size += 1
+            path.append(node)
+            if newnode < node:
                 if not node.left:
                     self._insert_left(node, newnode)
                     break
-                else:
-                    node = node.left
-            elif newnode > node:
+                node = node.left
+            else: # equal values go after the ones already there
                 if not node.right:
                     self._insert_right(node, newnode)
                     break
-                else:
-                    node = node.right
+                node = node.right
+        if len(path) > math.log(self._root.size, 1 / self._ALPHA):
+            self._rebuild_scapegoat(path)
+
+    def _rebuild_scapegoat (self, path):
+        """
+        Private method: rebuilds balanced the subtree of the deepest node
+        in $path (the ancestors of a new node, from the root) having a
+        child bigger than _ALPHA times itself.
+        """
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            if max(node.left.size, node.right.size) > self._ALPHA * node.size:
+                break
+        # parent links aren't reliable here (see _node_rew), use the path
+        parent = path[i - 1] if i else None
+        nodes = list(self._inorder(node))
+        subtree = self._relink(nodes, 0, len(nodes), parent)
+        if parent is None:
+            self._set_root(subtree)
+        elif parent.left is node:
+            parent.left = subtree
+        else:
+            parent.right = subtree
+
+    def _relink (self, nodes, start, stop, parent):
+        """Private method: like _mksubtree, reusing the (sorted) $nodes."""
+        if start >= stop:
+            return self._EMPTY
+        mid = (start + stop) // 2
+        node = nodes[mid]
+        node.parent = parent
+        node.left = self._relink(nodes, start, mid, node)
+        node.right = self._relink(nodes, mid + 1, stop, node)
+        node.size = stop - start
+        return node
+
+    @staticmethod
+    def _inorder (node):
+        """Private method: yields the nodes of the subtree rooted at $node, in order."""
+        stack = []
+        while stack or node:
+            if node:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node
+                node = node.right
+
+    def height (self):
+        """Returns the height of the tree (0 if empty)."""
+        height = 0
+        level = [self._root] if self._root else []
+        while level:
+            height += 1
+            level = [child for node in level for child in (node.left, node.right) if child]
+        return height
 
     def _insert_left (self, node, newnode):
         newnode.left = node.left
-        newnode.left.parent = newnode
+        if newnode.left:
+            newnode.left.parent = newnode
+            newnode.size += newnode.left.size
         newnode.parent = node
         node.left = newnode
 
     def _insert_right (self, node, newnode):
         newnode.right = node.right
-        newnode.right.parent = newnode
+        if newnode.right:
+            newnode.right.parent = newnode
+            newnode.size += newnode.right.size
         newnode.parent = node
         node.right = newnode
 
     def _mknode (self, value):
-        node = BinaryNode(value)
-        node.childs = [BinaryNode(None), BinaryNode(None)]
+        node = SizedBinaryNode(value)
+        node.left = node.right = self._EMPTY
+        return node
+
+    def _mksubtree (self, values, start, stop, parent=None):
+        """Private method: returns the root of a balanced
+        subtree made from the sorted values[start:stop]."""
+        if start >= stop:
+            return self._EMPTY
+        mid = (start + stop) // 2
+        node = self._mknode(values[mid])
+        node.parent = parent
+        node.left = self._mksubtree(values, start, mid, node)
+        node.right = self._mksubtree(values, mid + 1, stop, node)
+        node.size = stop - start
         return node
 
     def _node_ffw_left(self, node):
@@ -218,8 +409,80 @@ class SortedTree:
             self.add(item)
         return self
 
+    def extend_sorted (self, seq):
+        """
+        Extend the tree with the items from $seq, rebuilding it balanced.
+        Takes O(n) if $seq is already sorted (or reverse sorted),
+        otherwise the sorted runs of $seq are merged in O(n log r).
+        """
+        runs = sorted_runs(seq)
+        if self._root:
+            runs.append(self.tolist())
+        values = merge_runs(runs)
+        if values:
+            self._set_root(self._mksubtree(values, 0, len(values)))
+        return self
+
+    @classmethod
+    def from_sorted (cls, seq):
+        """Make a balanced SortedTree from $seq (see extend_sorted)."""
+        return cls().extend_sorted(seq)
+
+    def irange (self, lo=None, hi=None):
+        """
+        Yields the values v such that $lo <= v <= $hi, in order.
+        $lo and $hi default to None, meaning no lower or upper bound.
+        Takes O(log n + k) for k values yielded.
+        """
+        stack = []
+        node = self._root
+        while stack or node:
+            if node:
+                if lo is not None and node.value < lo:
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+            else:
+                node = stack.pop()
+                if hi is not None and node.value > hi:
+                    return
+                yield node.value
+                node = node.right
+
+    def rank (self, value):
+        """Returns the number of values lesser than $value, in O(log n)."""
+        count = 0
+        node = self._root
+        while node:
+            if node.value < value:
+                count += node.left.size + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def select (self, k):
+        """Returns the $k-th smallest value (starting from 0,
+        negative $k counts from the end like list indexes) in O(log n)."""
+        size = self._root.size
+        if k < 0:
+            k += size
+        if not 0 <= k < size:
+            raise IndexError('SortedTree index out of range')
+        node = self._root
+        while True:
+            left = node.left.size
+            if k < left:
+                node = node.left
+            elif k == left:
+                return node.value
+            else:
+                k -= left + 1
+                node = node.right
+
     def tolist(self):
-        stack = deque([self._root])
+        stack = deque([self._root] if self._root else [])
         _sorted = []
         while stack:
             item = stack.popleft()
@@ -237,23 +500,55 @@ class SortedTree:
 ###############
 
 class SortedList:
-    """Sorted linked list."""
+    """Sorted linked list.
+    An index of one node every INDEX_STEP nodes is (re)built on demand
+    after changes, for the order statistics methods (select, rank, irange)."""
+    INDEX_STEP = 32
     def __init__ (self, seq=None):
+        self._set_root(None)
         if seq:
-            it = iter(seq)
-            v = next(it)
-            self._set_root(v)
-            self.extend(it)
-        else:
-            self._set_root(None)
+            self.extend_sorted(seq)
     def __repr__ (self):
         return 'SortedList({},{})'.format(self._node_min,self._node_max)
+    def __len__ (self):
+        return self._size
 
     def _set_root (self, val):
         if isinstance(val, ListNode):
             self._node_min = self._node_max = self._root = val
         else:
             self._node_min = self._node_max = self._root = self._mknode(val)
+        self._size = 1 if self._root else 0
+        self._index = None
+
+    def _get_index (self):
+        """Private method: returns the (nodes, values) index lists,
+        building them if needed (in O(n), like a single add)."""
+        if self._index is None:
+            nodes = []
+            node = self._node_min
+            while node:
+                nodes.append(node)
+                for _ in range(self.INDEX_STEP):
+                    node = node.next
+                    if node is None:
+                        break
+            self._index = nodes, [node.value for node in nodes]
+        return self._index
+
+    def _node_from (self, value):
+        """Private method: returns the first node not lesser than
+        $value (None if missing) and its position in the list."""
+        nodes, values = self._get_index()
+        block = bisect.bisect_left(values, value) - 1
+        if block < 0:
+            return self._node_min if nodes else None, 0
+        node = nodes[block]
+        pos = block * self.INDEX_STEP
+        while node is not None and node.value < value:
+            node = node.next
+            pos += 1
+        return node, pos
 
     def _mknode (self, value):
         return ListNode(value)
@@ -263,6 +558,8 @@ class SortedList:
         if not self._root:
             self._set_root(newnode)
             return
+        self._size += 1
+        self._index = None
         while True:
             if newnode <= node:
                 if not node.prev:
@@ -313,6 +610,89 @@ class SortedList:
             self.add(item)
         return self
 
+    def extend_sorted (self, seq):
+        """
+        Extend the list with the items from $seq merging them in a single
+        pass over the list. Takes O(n) if $seq is already sorted (or reverse
+        sorted), otherwise the sorted runs of $seq are merged in O(n log r).
+        """
+        values = iter(merge_runs(sorted_runs(seq)))
+        if not self._root:
+            for value in values:
+                self._set_root(value)
+                break
+            else:
+                return self
+            # keep the root in the middle, for shorter add() walks
+            mid = self._root
+            for count, value in enumerate(values):
+                newnode = self._mknode(value)
+                self._node_max.next = newnode
+                newnode.prev = self._node_max
+                self._node_max = newnode
+                self._size += 1
+                if count % 2:
+                    mid = mid.next
+            self._root = mid
+            return self
+        self._index = None
+        node = self._node_min
+        for value in values:
+            self._size += 1
+            newnode = self._mknode(value)
+            while node is not None and node.value < value:
+                node = node.next
+            if node is None:
+                self._node_max.next = newnode
+                newnode.prev = self._node_max
+                self._node_max = newnode
+            elif node.prev is None:
+                node.prev = newnode
+                newnode.next = node
+                self._node_min = newnode
+            else:
+                self._insert_prev(newnode, node)
+        return self
+
+    @classmethod
+    def from_sorted (cls, seq):
+        """Make a SortedList from $seq (see extend_sorted)."""
+        return cls().extend_sorted(seq)
+
+    def irange (self, lo=None, hi=None):
+        """
+        Yields the values v such that $lo <= v <= $hi, in order.
+        $lo and $hi default to None, meaning no lower or upper bound.
+        Takes O(log(n) + INDEX_STEP + k) for k values yielded.
+        """
+        if lo is None:
+            node = self._node_min
+        else:
+            node, _ = self._node_from(lo)
+        while node:
+            if hi is not None and node.value > hi:
+                return
+            yield node.value
+            node = node.next
+
+    def rank (self, value):
+        """Returns the number of values lesser than $value,
+        in O(log(n) + INDEX_STEP)."""
+        return self._node_from(value)[1]
+
+    def select (self, k):
+        """Returns the $k-th smallest value (starting from 0, negative $k
+        counts from the end like list indexes) in O(INDEX_STEP)."""
+        if k < 0:
+            k += self._size
+        if not 0 <= k < self._size:
+            raise IndexError('SortedList index out of range')
+        block, k = divmod(k, self.INDEX_STEP)
+        node = self._get_index()[0][block]
+        for _ in range(k):
+            node = node.next
+        return node.value
+
     def min (self):
         return self._node_min.value
 
@@ -328,6 +708,197 @@ class SortedList:
         return lst
 
 
+####################
+# DISK SORTED LIST #
+####################
+
+class DiskSortedList:
+    """
+    Sorted list of numbers stored on disk, for data which doesn't fit in memory.
+    Values are kept in sorted blocks of at most $block_size items in a memory
+    mapped file, as array.array of the given $typecode (default 'q', i.e.
+    signed long long), and only a small index of the blocks (position in the
+    file, size and min value) is kept in memory. The index is saved in the
+    $path + '.index' file by flush() and close() (also when used as a context
+    manager), so an existing DiskSortedList can be opened again later: in
+    this case, the saved typecode and block size are used.
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'numbers')
+    >>> with DiskSortedList(path, block_size=4) as d:
+    ...     d.extend([5, 1, 9, 3, 7, 2, 8]).add(4)
+    ...     list(d), list(d.irange(3, 7))
+    ([1, 2, 3, 4, 5, 7, 8, 9], [3, 4, 5, 7])
+    >>> len(DiskSortedList(path))
+    8
+    """
+    # number of blocks of the sorted chunks loaded in memory by extend()
+    CHUNK_BLOCKS = 64
+    def __init__ (self, path, typecode='q', block_size=4096):
+        self._path = path
+        self._index_path = path + '.index'
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as index:
+                info = json.load(index)
+            typecode, block_size = info['typecode'], info['block_size']
+            self._slots, self._counts, self._mins = info['slots'], info['counts'], info['mins']
+        elif os.path.exists(path) and os.path.getsize(path):
+            raise ValueError(f'{path}: missing index file {self._index_path}')
+        else:
+            self._slots, self._counts, self._mins = [], [], []
+        if block_size < 2:
+            raise ValueError('block_size must be >= 2')
+        self._typecode = typecode
+        self._block_size = block_size
+        self._block_bytes = array.array(typecode).itemsize * block_size
+        self._size = sum(self._counts)
+        self._nslots = len(self._slots)
+        self._file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        self._mmap = None
+        self._map(max(self._nslots, 1))
+
+    def __repr__ (self):
+        return 'DiskSortedList({!r},{!r},{})'.format(self._path, self._typecode, self._block_size)
+    def __enter__ (self):
+        return self
+    def __exit__ (self, *exc_info):
+        self.close()
+    def __iter__ (self):
+        return self.irange()
+    def __len__ (self):
+        return self._size
+
+    def _map (self, nslots):
+        """Private method: (re)map the file, making room for $nslots blocks."""
+        if self._mmap is not None:
+            self._mmap.close()
+        size = nslots * self._block_bytes
+        if os.path.getsize(self._path) < size:
+            self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._mapped_slots = len(self._mmap) // self._block_bytes
+
+    def _new_slot (self):
+        """Private method: returns a free slot for a block, growing the file if needed."""
+        if self._nslots == self._mapped_slots:
+            self._map(self._mapped_slots * 2)
+        self._nslots += 1
+        return self._nslots - 1
+
+    def _read (self, i):
+        """Private method: returns the $i-th block as an array."""
+        start = self._slots[i] * self._block_bytes
+        block = array.array(self._typecode)
+        block.frombytes(self._mmap[start:start + self._counts[i] * block.itemsize])
+        return block
+
+    def _store (self, i, values):
+        """
+        Private method: store the sorted array $values in place of the $i-th block
+        (or as the first block, if the list is empty), splitting it in more blocks
+        of (about) the same size if needed. Returns the number of blocks stored.
+        """
+        parts = -(-len(values) // self._block_size)
+        step = -(-len(values) // parts)
+        for n, start in enumerate(range(0, len(values), step)):
+            piece = values[start:start + step]
+            if n == 0 and self._slots:
+                self._size -= self._counts[i]
+                self._counts[i], self._mins[i] = len(piece), piece[0]
+            else:
+                self._slots.insert(i + n, self._new_slot())
+                self._counts.insert(i + n, len(piece))
+                self._mins.insert(i + n, piece[0])
+            offset = self._slots[i + n] * self._block_bytes
+            data = piece.tobytes()
+            self._mmap[offset:offset + len(data)] = data
+        self._size += len(values)
+        return parts
+
+    def _merge (self, values):
+        """Private method: merge the sorted list $values into the blocks."""
+        pos = 0
+        while pos < len(values):
+            i = max(bisect.bisect_right(self._mins, values[pos]) - 1, 0)
+            if i + 1 < len(self._mins):
+                end = bisect.bisect_left(values, self._mins[i + 1], pos)
+            else:
+                end = len(values)
+            if self._slots:
+                block = array.array(self._typecode, heapq.merge(self._read(i), values[pos:end]))
+            else:
+                block = array.array(self._typecode, values[pos:end])
+            self._store(i, block)
+            pos = end
+
+    def add (self, value):
+        """Add $value to the list, in O(block_size + log(blocks))."""
+        self._merge([value])
+
+    def extend (self, seq):
+        """
+        Extend the list with the items from $seq, which are
+        sorted in memory in chunks of CHUNK_BLOCKS blocks at most,
+        then merged into the blocks in a single pass for every chunk.
+        """
+        it = iter(seq)
+        chunk_size = self._block_size * self.CHUNK_BLOCKS
+        while True:
+            chunk = sorted(itertools.islice(it, chunk_size))
+            if not chunk:
+                return self
+            self._merge(chunk)
+
+    def irange (self, lo=None, hi=None):
+        """
+        Yields the values v such that $lo <= v <= $hi, in order, reading
+        a block at a time. $lo and $hi default to None, meaning no lower
+        or upper bound.
+        """
+        # the last block starting before $lo may hold some $lo values too,
+        # as any following block with min == $lo
+        i = 0 if lo is None else max(bisect.bisect_left(self._mins, lo) - 1, 0)
+        for i in range(i, len(self._slots)):
+            if hi is not None and self._mins[i] > hi:
+                return
+            block = self._read(i)
+            start = 0 if lo is None else bisect.bisect_left(block, lo)
+            for value in itertools.islice(block, start, None):
+                if hi is not None and value > hi:
+                    return
+                yield value
+
+    def min (self):
+        if not self._size:
+            raise ValueError('empty DiskSortedList')
+        return self._mins[0]
+
+    def max (self):
+        if not self._size:
+            raise ValueError('empty DiskSortedList')
+        return self._read(len(self._slots) - 1)[-1]
+
+    def tolist (self):
+        return list(self)
+
+    def flush (self):
+        """Write the changes and the blocks index to disk."""
+        self._mmap.flush()
+        tmp = self._index_path + '.tmp'
+        with open(tmp, 'w') as index:
+            json.dump({'typecode': self._typecode, 'block_size': self._block_size,
+                       'slots': self._slots, 'counts': self._counts, 'mins': self._mins},
+                      index)
+        os.replace(tmp, self._index_path)
+
+    def close (self):
+        """Flush and close the list."""
+        if self._mmap is not None:
+            self.flush()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+
+
 ## Following OrderedList snze SizedOrderedList are even slower
 ## than SortedList, keeped here for some reasons.
 
@@ -580,51 +1151,125 @@ class SizedOrderedList(OrderedList):
         return value
 
 
+class _HeapEntry:
+    """SizedOrderedHeap's entry, ordered by the wrapped node's value."""
+    __slots__ = ('node',)
+    def __init__ (self, node):
+        self.node = node
+    def __lt__ (self, other):
+        return self.node.value < other.node.value
+
+
+class _RevHeapEntry(_HeapEntry):
+    """SizedOrderedHeap's entry, ordered by the wrapped node's value reversed."""
+    __slots__ = ()
+    def __lt__ (self, other):
+        return other.node.value < self.node.value
+
+
+class _RevKey:
+    """SizedOrderedHeap's entry for frozen keys, ordered by $value reversed."""
+    __slots__ = ('value',)
+    def __init__ (self, value):
+        self.value = value
+    def __lt__ (self, other):
+        return other.value < self.value
+
+
 # For comparing SizedOrderedList's N-min and N-max values extraction:
 class SizedOrderedHeap:
-    """Sized linked heap"""
+    """Sized heap, keeps only the $maxsize min (or max) values."""
     MIN = 'min'
     MAX = 'max'
-    def __init__ (self, maxsize, seq=[], which=MIN):
+    def __init__ (self, maxsize, seq=[], which=MIN, keyfunc=None, freeze=True):
         """
         Make a SizedOrderedHeap from $seq.
-        The $maxsize argument is the number of elements returned from the heap,
+        The $maxsize argument is the number of elements kept in the heap,
         while $which must be either SizedOrderedHeap.MIN (the default) or SizedOrderedHeap.MAX
-        and affects which ($maxsize) values will be returned.
+        and affects which ($maxsize) values will be kept.
+        $keyfunc and $freeze works like in OrderedList (see FreezeNode): the
+        keyfunc(item) values are the ones compared and returned by tolist().
         """
-        self._getval = self._choose_which(which)
+        if maxsize < 0:
+            raise ValueError('maxsize must be >= 0')
         self._maxsize = maxsize
-        self._seq = list(seq) # to mimic SizedOrderedList, no inplace use
-        heapq.heapify(self._seq)
+        self._which = which
+        self._keyfunc = keyfunc
+        self._freeze = freeze
+        self._mkentry, self._getval = self._choose_which(which)
+        self._heap = []
+        self.extend(seq)
 
     def _choose_which (self, which):
-        if which == SizedOrderedHeap.MIN:
-            return heapq.nsmallest
-        elif which == SizedOrderedHeap.MAX:
-            return lambda n, seq: list(reversed(heapq.nlargest(n, seq)))
-        else:
+        """
+        Private method: returns the callables to make the heap entries
+        and to get their values back. The heap is a min-heap of the
+        $maxsize max values or a (reversed) max-heap of the $maxsize min
+        values, so heap[0] is always the first value to be dropped.
+        """
+        keyfunc, freeze = self._keyfunc, self._freeze
+        if which not in (SizedOrderedHeap.MIN, SizedOrderedHeap.MAX):
             raise ValueError('wrong value for "which"')
+        elif keyfunc is not None and not freeze:
+            entry = _RevHeapEntry if which == SizedOrderedHeap.MIN else _HeapEntry
+            return ((lambda value: entry(FreezeNode(value, keyfunc, freeze))),
+                    operator.attrgetter('node.value'))
+        # frozen keys (or plain values) are computed once and stored as they are:
+        if keyfunc is None:
+            keyfunc = lambda value: value
+        if which == SizedOrderedHeap.MIN:
+            return ((lambda value: _RevKey(keyfunc(value))),
+                    operator.attrgetter('value'))
+        return keyfunc, (lambda entry: entry)
+
+    @property
+    def size (self):
+        """Actual size"""
+        return len(self._heap)
+
+    @property
+    def is_full (self):
+        """True if the actual size is the max size for this heap"""
+        return len(self._heap) == self._maxsize
 
     def extend (self, seq):
         """Extend the heap with the items from $seq."""
         for item in seq:
-            heapq.heappush(self._seq, item)
+            self.push(item)
         return self
 
     def push (self, value):
-        heapq.heappush(self._seq, value)
+        """
+        Return the pushed $value or FailedPush, in O(log maxsize).
+        When the heap is full, $value replaces the worst kept value
+        only if it's better (i.e. lesser for MIN, greater for MAX),
+        otherwise is not pushed.
+        """
+        entry = self._mkentry(value)
+        heap = self._heap
+        if len(heap) < self._maxsize:
+            heapq.heappush(heap, entry)
+        elif heap and heap[0] < entry:
+            heapq.heapreplace(heap, entry)
+        else:
+            return FailedPush
+        return value
 
     # push alias:
     add = push
 
-    def tolist (self, size=None, min_or_max=None):
+    def tolist (self, size=None):
         """
-        $size and $min_or_max (both default to None) can be used to
-        overload the default $maxsize and $which values for this instance.
+        Returns the kept values in ascending order, in O(maxsize log maxsize).
+        $size (default to None) can be used to get only
+        the $size min (or max) values.
         """
-        getval = self._getval if min_or_max is None else self._set_which(min_or_max)
-        getsize = self._maxsize if size is None else size
-        return getval(getsize, self._seq)
+        values = sorted(map(self._getval, self._heap))
+        if size is None or size >= len(values):
+            return values
+        if self._which == SizedOrderedHeap.MIN:
+            return values[:size]
+        return values[len(values)-size:]
 
 
 ###############
@@ -681,6 +1326,125 @@ def _test_heap_eq ():
         tol = sl.tolist()
         toh = sh.tolist()
         assert tol == toh, f'[MAX] tol != toh {tol}\n\n\n{toh}'
+        for freeze in (True, False):
+            sl = SizedOrderedList(maxsize, seq, keyfunc=abs, freeze=freeze)
+            sh = SizedOrderedHeap(maxsize, seq, keyfunc=abs, freeze=freeze)
+            assert sl.tolist() == sh.tolist(), f'[MIN] (keyfunc, freeze={freeze}) tol != toh'
+            sl = SizedOrderedList(maxsize, seq, keyfunc=abs, freeze=freeze, cut=SizedOrderedList.START)
+            sh = SizedOrderedHeap(maxsize, seq, which=SizedOrderedHeap.MAX, keyfunc=abs, freeze=freeze)
+            assert sl.tolist() == sh.tolist(), f'[MAX] (keyfunc, freeze={freeze}) tol != toh'
+        size = randint(0, maxsize)
+        assert sh.tolist(size) == sorted(map(abs, seq))[len(seq)-size:], '[MAX] tolist(size)'
+        sh = SizedOrderedHeap(maxsize, seq)
+        assert sh.tolist(size) == sorted(seq)[:size], '[MIN] tolist(size)'
+        assert sh.is_full and sh.size == maxsize
+        assert sh.push(max(seq)+1) is FailedPush
+
+def _test_bulk (obj):
+    """obj is the object to test, e.g. SortedList or SortedTree."""
+    seqs, sorted_s, rev_s = _make_seqs()
+    for rand_seq, sort_seq, rev_seq in zip(seqs, sorted_s, rev_s):
+        for seq in (rand_seq, sort_seq, rev_seq):
+            assert obj.from_sorted(seq).tolist() == sort_seq, f'[FAIL] from_sorted [{obj}]'
+        pivot = int(len(rand_seq)/2)
+        s1 = obj(rand_seq[:pivot])
+        s1.extend_sorted(sorted(rand_seq[pivot:]))
+        assert s1.tolist() == sort_seq, f'[FAIL] extend_sorted [{s1}]'
+        s2 = obj.from_sorted(rand_seq[:pivot])
+        s2.extend_sorted(rand_seq[pivot:])
+        s2.extend(rand_seq[:pivot])
+        assert s2.tolist() == sorted(rand_seq + rand_seq[:pivot]), f'[FAIL] extend_sorted + extend [{s2}]'
+    assert obj.from_sorted([]).tolist() == obj().tolist() == []
+
+def _test_query (obj):
+    """obj is the object to test, e.g. SortedList or SortedTree."""
+    import random
+    seqs, sorted_s, _ = _make_seqs()
+    for rand_seq, sort_seq in zip(seqs, sorted_s):
+        for s in (obj(rand_seq), obj().extend(rand_seq)):
+            assert len(s) == len(sort_seq), f'[FAIL] len [{s}]'
+            for k in range(-len(sort_seq), len(sort_seq)):
+                assert s.select(k) == sort_seq[k], f'[FAIL] select({k}) [{s}]'
+            for _ in range(50):
+                lo, hi = sorted(random.randint(-11000, 11000) for _ in range(2))
+                assert s.rank(lo) == bisect.bisect_left(sort_seq, lo), f'[FAIL] rank({lo}) [{s}]'
+                assert (list(s.irange(lo, hi))
+                        == sort_seq[bisect.bisect_left(sort_seq, lo):bisect.bisect_right(sort_seq, hi)]
+                        ), f'[FAIL] irange({lo}, {hi}) [{s}]'
+            assert list(s.irange()) == sort_seq, f'[FAIL] irange() [{s}]'
+    if obj is SortedTree:
+        # sorted, reverse sorted and equal insertions keep it balanced
+        size = 5000
+        for seq in (range(size), range(size, 0, -1), [7] * size,
+                    [random.randint(0, 9) for _ in range(size)]):
+            s = obj().extend(seq)
+            sort_seq = sorted(seq)
+            assert s.height() <= math.log(size, 1.5) + 1, f'[FAIL] height {s.height()}'
+            assert s.tolist() == sort_seq, '[FAIL] tolist (balanced)'
+            for k in random.sample(range(size), 50):
+                assert s.select(k) == sort_seq[k], f'[FAIL] select({k}) (balanced)'
+                value = sort_seq[k]
+                assert s.rank(value) == bisect.bisect_left(sort_seq, value), f'[FAIL] rank({value}) (balanced)'
+            s.extend(seq)
+            assert s.height() <= math.log(2 * size, 1.5) + 1, f'[FAIL] height after tolist {s.height()}'
+            assert list(s.irange()) == sorted(sort_seq * 2), '[FAIL] irange after tolist (balanced)'
+    s = obj()
+    assert len(s) == 0 and list(s.irange()) == [] and s.rank(1) == 0
+    for k in (0, -1):
+        try:
+            s.select(k)
+            raise AssertionError(f'[FAIL] select({k}) on empty [{s}]')
+        except IndexError:
+            pass
+
+def _test_disk ():
+    import random
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'disk_sorted_list')
+        values = []
+        with DiskSortedList(path, block_size=16) as dl:
+            assert list(dl) == [] and len(dl) == 0
+            for _ in range(20):
+                seq = [random.randint(-10000, 10000) for _ in range(random.randint(0, 300))]
+                dl.extend(random.choice((seq, sorted(seq))))
+                dl.add(seq[0] if seq else 0)
+                values.extend(seq)
+                values.append(seq[0] if seq else 0)
+            values.sort()
+            assert list(dl) == values, '[FAIL] DiskSortedList: iteration'
+            assert (dl.min(), dl.max()) == (values[0], values[-1]), '[FAIL] DiskSortedList: min/max'
+        dl = DiskSortedList(path)
+        assert dl.tolist() == values and len(dl) == len(values), '[FAIL] DiskSortedList: reopening'
+        for _ in range(100):
+            lo, hi = sorted(random.randint(-11000, 11000) for _ in range(2))
+            assert (list(dl.irange(lo, hi))
+                    == values[bisect.bisect_left(values, lo):bisect.bisect_right(values, hi)]
+                    ), f'[FAIL] DiskSortedList: irange({lo}, {hi})'
+        dl.extend(range(1000))
+        dl.close()
+        values = sorted(values + list(range(1000)))
+        with DiskSortedList(path) as dl:
+            assert dl.tolist() == values, '[FAIL] DiskSortedList: reopening after extend'
+        # duplicates spanning several blocks
+        path = os.path.join(tmpdir, 'disk_sorted_list_dup')
+        with DiskSortedList(path, block_size=4) as dl:
+            for method in ('min', 'max'):
+                try:
+                    getattr(dl, method)()
+                except ValueError:
+                    pass
+                else:
+                    raise AssertionError(f'[FAIL] DiskSortedList: {method}() on empty list')
+            dl.extend([5] * 10 + [1, 9])
+            assert list(dl.irange(5, 5)) == [5] * 10, f'[FAIL] DiskSortedList: irange(5, 5) {list(dl.irange(5, 5))}'
+            assert list(dl.irange(2, 9)) == [5] * 10 + [9], '[FAIL] DiskSortedList: irange(2, 9)'
+            assert list(dl.irange(5)) == [5] * 10 + [9], '[FAIL] DiskSortedList: irange(5)'
+            values = [1] + [5] * 10 + [9]
+            for _ in range(50):
+                dl.add(5)
+                values.insert(1, 5)
+                assert list(dl.irange(5, 5)) == values[1:-1], '[FAIL] DiskSortedList: irange (dup)'
 
 def _test_time (repeat=50):
     import timeit
@@ -707,29 +1471,228 @@ else:
                           setup=mf_setup,
                           globals=locals()).timeit(repeat)
         print(report.format(f'{cls_name}:', t/repeat))
-        
+
+def _test_memory (lenght=5000):
+    """Report the memory used (bytes per element) by the containers."""
+    import random
+    import tracemalloc
+    seq = [random.randint(-10000, 10000) for _ in range(lenght)]
+    report = '{:30} {:>10.2f} bytes/item'
+    makers = (('list', list),
+              ('SortedList', SortedList),
+              ('SortedTree', SortedTree),
+              ('OrderedList', OrderedList),
+              ('SizedOrderedList', lambda s: SizedOrderedList(lenght, s)),
+              ('SizedOrderedHeap', lambda s: SizedOrderedHeap(lenght, s)))
+    print(f'(items = {lenght})')
+    for name, make in makers:
+        tracemalloc.start()
+        obj = make(seq)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del obj
+        print(report.format(f'{name}:', size/lenght))
+
+class _BenchSorted:
+    """sorted() (and bisect) as a container, for the benchmark."""
+    def __init__ (self, seq):
+        self.seq = sorted(seq)
+    def add (self, value):
+        bisect.insort(self.seq, value)
+    def irange (self, lo, hi):
+        return self.seq[bisect.bisect_left(self.seq, lo):bisect.bisect_right(self.seq, hi)]
+    def min (self):
+        return self.seq[0]
+    def max (self):
+        return self.seq[-1]
+    def tolist (self):
+        return list(self.seq)
+
+# name: (make, minmax, irange), None for unsupported operations.
+BENCH_CONTAINERS = {
+    'SortedTree': (SortedTree,
+                   lambda obj: (obj.select(0), obj.select(-1)),
+                   lambda obj, lo, hi: list(obj.irange(lo, hi))),
+    'SortedList': (SortedList,
+                   lambda obj: (obj.min(), obj.max()),
+                   lambda obj, lo, hi: list(obj.irange(lo, hi))),
+    'OrderedList': (OrderedList, None, None),
+    'SizedOrderedHeap': (lambda seq: SizedOrderedHeap(len(seq), seq), None, None),
+    'sorted': (_BenchSorted,
+               lambda obj: (obj.min(), obj.max()),
+               lambda obj, lo, hi: obj.irange(lo, hi)),
+}
+# max input size for the containers with quadratic costs:
+BENCH_MAX_SIZE = {'SortedList': 10**6, 'OrderedList': 10**3}
+BENCH_INPUTS = ('random', 'sorted', 'reversed', 'few-unique')
+BENCH_SIZES = (10**3, 10**4, 10**5, 10**6, 10**7)
+
+def _bench_input (kind, size):
+    import random
+    r = random.randint
+    if kind == 'few-unique':
+        return [r(0, 9) for _ in range(size)]
+    seq = [r(-size*10, size*10) for _ in range(size)]
+    if kind == 'sorted':
+        seq.sort()
+    elif kind == 'reversed':
+        seq.sort(reverse=True)
+    elif kind != 'random':
+        raise ValueError(f'unknown input kind: {kind}')
+    return seq
+
+def _bench_op (func, ops):
+    """Returns a dict with the time and the throughput of $func,
+    which is assumed to perform $ops operations each call."""
+    import timeit
+    number, total = timeit.Timer(func).autorange()
+    return {'seconds': total/number, 'ops': ops, 'per_sec': ops*number/total}
+
+def _bench (sizes=BENCH_SIZES, inputs=BENCH_INPUTS, names=tuple(BENCH_CONTAINERS),
+            adds=100, queries=100, memory=True):
+    """
+    Benchmark the containers in $names for every input kind in $inputs
+    and every size in $sizes, measuring the throughput of building from
+    the input, $adds single add(), iteration (tolist), min/max and
+    $queries range queries (of ~10 items). When $memory is true the
+    peak memory of the building (from tracemalloc) is also measured.
+    Returns a list of dicts (one for every name, input, size) with the results.
+    Progress lines are printed on stderr, leaving stdout to the results.
+    """
+    import random
+    import tracemalloc
+    results = []
+    report = '{:18} {:10} {:>9} {:>8} {:>14.0f} items/s  peak: {}'
+    for size in sizes:
+        for kind in inputs:
+            seq = _bench_input(kind, size)
+            sseq = sorted(seq)
+            extra = _bench_input('random', adds)
+            bounds = []
+            for _ in range(queries):
+                i = random.randrange(size)
+                bounds.append((sseq[i], sseq[min(i+10, size-1)]))
+            for name in names:
+                if size > BENCH_MAX_SIZE.get(name, size):
+                    continue
+                make, minmax, irange = BENCH_CONTAINERS[name]
+                res = {'container': name, 'input': kind, 'size': size}
+                res['build'] = _bench_op(lambda: make(seq), size)
+                obj = make(seq)
+                res['iterate'] = _bench_op(obj.tolist, size)
+                res['minmax'] = minmax and _bench_op(lambda: minmax(obj), 1)
+                res['irange'] = irange and _bench_op(
+                    lambda: [irange(obj, lo, hi) for lo, hi in bounds], queries)
+                def _add ():
+                    for value in extra:
+                        obj.add(value)
+                res['add'] = _bench_op(_add, adds)
+                del obj
+                res['peak_bytes'] = res['bytes_per_item'] = None
+                if memory:
+                    tracemalloc.start()
+                    obj = make(seq)
+                    size_bytes, res['peak_bytes'] = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    res['bytes_per_item'] = size_bytes/size
+                    del obj
+                print(report.format(name, kind, size, 'build',
+                                    res['build']['per_sec'], res['peak_bytes']),
+                      file=sys.stderr)
+                results.append(res)
+    return results
+
+def _test_nodes ():
+    n = Node(1)
+    assert n.childs == () and n.is_leaf() and n.is_root(), '[FAIL] Node: leaf'
+    for method in (n.add_child, n.remove_child):
+        try:
+            method(Node(2))
+        except TypeError:
+            pass
+        else:
+            raise AssertionError(f'[FAIL] Node.{method.__name__}: no error?')
+    t = TreeNode(1)
+    c = TreeNode(2, t)
+    t.add_child(c)
+    assert t.childs == (c,) and not t.is_leaf() and c.parent is t, '[FAIL] TreeNode.add_child'
+    t.remove_child(c)
+    assert t.is_leaf(), '[FAIL] TreeNode.remove_child'
+    b = BinaryNode(5)
+    b.add_child(BinaryNode(7))
+    b.add_child(BinaryNode(3))
+    assert [x.value for x in b.childs] == [3, 7], '[FAIL] BinaryNode.add_child'
+    for cls in (ListNode, BinaryNode, SizedBinaryNode):
+        assert not hasattr(cls(1), '__dict__'), f'[FAIL] {cls.__name__}: not slotted'
+        assert '_childs' not in {s for k in cls.__mro__ for s in getattr(k, '__slots__', ())}, f'[FAIL] {cls.__name__}: _childs slot'
+
 def _test():
+    print('*** Test nodes: ', end='')
+    _test_nodes()
+    print('OK')
     for cls in (SortedList, SortedTree, OrderedList, SizedOrderedList, SizedOrderedHeap):
         print('*** Test equality ({}): '.format(cls.__name__), end='')
         _test_eq(cls)
         print('OK')
+    for cls in (SortedList, SortedTree):
+        print('*** Test bulk loading ({}): '.format(cls.__name__), end='')
+        _test_bulk(cls)
+        print('OK')
+    for cls in (SortedList, SortedTree):
+        print('*** Test queries ({}): '.format(cls.__name__), end='')
+        _test_query(cls)
+        print('OK')
+    print('*** Test DiskSortedList: ', end='')
+    _test_disk()
+    print('OK')
     print('*** Test eq (SizedOrderedList vs SizedOrderedHeap): ', end='')
     _test_heap_eq()
     print('OK')
 
 
 if __name__ == '__main__':
-    import sys
     import argparse
     p = argparse.ArgumentParser()
     p.add_argument('-t', '--test', dest='test', action='store_true', help='run tests')
     p.add_argument('-T', '--times', dest='times', action='store_true', help='run times comparison')
+    p.add_argument('-m', '--memory', dest='memory', action='store_true', help='run memory comparison')
+    p.add_argument('-b', '--bench', dest='bench', action='store_true',
+                   help='run the benchmark (see the -B -I -S -o options)')
+    p.add_argument('-B', '--bench-containers', dest='bench_names', nargs='+', metavar='NAME',
+                   choices=tuple(BENCH_CONTAINERS), default=tuple(BENCH_CONTAINERS),
+                   help='(bench) containers, choice from: %(choices)s. Default: all.')
+    p.add_argument('-I', '--bench-inputs', dest='bench_inputs', nargs='+', metavar='KIND',
+                   choices=BENCH_INPUTS, default=BENCH_INPUTS,
+                   help='(bench) input kinds, choice from: %(choices)s. Default: all.')
+    p.add_argument('-S', '--bench-sizes', dest='bench_sizes', nargs='+', metavar='N',
+                   type=int, default=BENCH_SIZES, help='(bench) input sizes (default: %(default)s)')
+    p.add_argument('-M', '--no-bench-memory', dest='bench_memory', action='store_false',
+                   help='(bench) skip the (slow) tracemalloc memory measurement')
+    p.add_argument('-o', '--output', dest='output', metavar='FILE',
+                   help='(bench) write the results as JSON in %(metavar)s (default: stdout)')
     args = p.parse_args()
     if args.test:
         _test()
     if args.times:
         print('*** Test times')
         _test_time()
+    if args.memory:
+        print('*** Test memory')
+        _test_memory()
+    if args.bench:
+        import json
+        import platform
+        print('*** Benchmark', file=sys.stderr)
+        results = {'python': platform.python_version(),
+                   'max_size': BENCH_MAX_SIZE,
+                   'results': _bench(args.bench_sizes, args.bench_inputs,
+                                     args.bench_names, memory=args.bench_memory)}
+        if args.output is None:
+            json.dump(results, sys.stdout, indent=1)
+            print()
+        else:
+            with open(args.output, 'w') as out:
+                json.dump(results, out, indent=1)
 
     
 
@@ -782,3 +1745,15 @@ OrderedList:                   0.450305s
 SizedOrderedList:              0.457118s
 SizedOrderedHeap:              0.000623s
 """
+
+"""
+$ python sorted_list_tree.py -m
+*** Test memory
+(items = 5000)
+list:                                8.01 bytes/item
+SortedList:                         64.97 bytes/item
+SortedTree:                         81.16 bytes/item
+OrderedList:                       352.54 bytes/item
+SizedOrderedList:                  352.07 bytes/item
+SizedOrderedHeap:                   48.53 bytes/item
+"""